@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Throughput benchmark of arduino_monitor against an emulated Arduino on a pseudo-terminal.
+
+For each rate the monitor is started as a subprocess on the pty, with its recording going to a
+temporary directory and the full rate Frames topic enabled. It reports:
+    - frames/s parsed by the monitor (from its Stats topic)
+    - frames lost between the emulator and the Frames topic (sequence counter in FrameNumber)
+    - latency from the emulator write to the Frames topic reception
+    - monitor CPU time per frame
+
+The monitor binds the usual ports (9990/9991), do not run it next to a live monitor.
+"""
+
+import sys, json, time, argparse, tempfile, subprocess
+import numpy as np
+import psutil
+import zmq
+from juice_scm_gse.arduino_monitor.emulator import ArduinoEmulator
+from juice_scm_gse.arduino_monitor.protocol import unpack_frames
+
+ENGINES = {
+    "threads": "from juice_scm_gse.arduino_monitor import main; main()",
+    "asyncio": "from juice_scm_gse.arduino_monitor.aio import main; main()"
+}
+
+
+def run(rate, duration, engine, raw_port=9994, warmup=2.):
+    emulator = ArduinoEmulator(rate=rate, duration=duration)
+    with tempfile.TemporaryDirectory() as workdir:
+        monitor = subprocess.Popen([sys.executable, '-c', ENGINES[engine], '--port', emulator.port,
+                                    '--workdir', workdir, '--raw-port', str(raw_port)],
+                                   stdout=subprocess.DEVNULL)
+        context = zmq.Context()
+        stats_sock = context.socket(zmq.SUB)
+        stats_sock.connect("tcp://localhost:9990")
+        stats_sock.setsockopt(zmq.SUBSCRIBE, b"Stats")
+        frames_sock = context.socket(zmq.SUB)
+        frames_sock.connect(f"tcp://localhost:{raw_port}")
+        frames_sock.setsockopt(zmq.SUBSCRIBE, b"Frames")
+        poller = zmq.Poller()
+        poller.register(stats_sock, zmq.POLLIN)
+        poller.register(frames_sock, zmq.POLLIN)
+        try:
+            time.sleep(warmup)                                                                                          #let the monitor open the port and flush it
+            process = psutil.Process(monitor.pid)
+            cpu_start = sum(process.cpu_times()[:2])
+            emulator.start()
+            sequences, latencies, stats = [], [], []
+            end = time.time() + duration + 1.
+            while time.time() < end:
+                for sock, _ in poller.poll(100):
+                    if sock is frames_sock:
+                        _, _, frames = unpack_frames(sock.recv_multipart(copy=False))
+                        received = time.time()
+                        sequence = frames[:, -1].astype(np.int64)
+                        sequences.append(sequence)
+                        latencies.append(received - emulator.sent_at[sequence[-1] % len(emulator.sent_at)])
+                    else:
+                        stats.append((time.time(), json.loads(sock.recv().split(b' ', 1)[1])))
+            cpu = sum(process.cpu_times()[:2]) - cpu_start
+        finally:
+            monitor.terminate()
+            monitor.wait()
+            context.destroy(linger=0)
+    received = np.unique(np.concatenate(sequences)) if sequences else np.empty(0)
+    parsed_rate = 0.
+    if len(stats) > 1:
+        (t0, first), (t1, last) = stats[0], stats[-1]
+        parsed_rate = (last["frames"] - first["frames"]) / (t1 - t0)
+    latencies = np.array(latencies) * 1e3 if latencies else np.zeros(1)
+    return {
+        "rate": rate,
+        "sent": emulator.sent,
+        "parsed/s": parsed_rate,
+        "lost": emulator.sent - len(received),
+        "latency p50 (ms)": np.percentile(latencies, 50),
+        "latency p99 (ms)": np.percentile(latencies, 99),
+        "CPU/frame (us)": cpu / max(len(received), 1) * 1e6
+    }
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", default="500,1000,2000,5000", help="comma separated frames per second")
+    parser.add_argument("--duration", type=float, default=10., help="seconds per rate")
+    parser.add_argument("--engine", choices=list(ENGINES), default="threads")
+    args = parser.parse_args(args)
+    results = [run(float(rate), args.duration, args.engine) for rate in args.rates.split(',')]
+    columns = list(results[0])
+    print('\t'.join(columns))
+    for result in results:
+        print('\t'.join(f"{result[column]:.1f}" if isinstance(result[column], float) else str(result[column])
+                        for column in columns))
+
+
+if __name__ == '__main__':
+    main()
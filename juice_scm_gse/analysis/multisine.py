@@ -0,0 +1,65 @@
+"""Broadband periodic excitations for transfer function measurements.
+
+A band is defined by its base frequency f0 (one period of the AWG buffer) and the harmonics k
+it excites. When the acquisition spans exactly `periods` periods, harmonic k falls on FFT bin
+k*periods without leakage, so no window is needed and all tones are extracted from one record.
+"""
+
+import numpy as np
+
+
+def plan_bands(f_start, f_stop, points_per_decade=33, k_min=16, k_max=512):
+    """Splits [f_start, f_stop] into bands of log spaced harmonics, returns a list of (f0, harmonics)"""
+    bands = []
+    f0 = f_start / k_min
+    while f0 * k_min < f_stop:
+        low, high = max(f_start, f0 * k_min), min(f_stop, f0 * k_max)
+        count = max(int(np.ceil(np.log10(high / low) * points_per_decade)), 1) + 1
+        harmonics = np.unique(np.round(np.logspace(np.log10(low / f0), np.log10(high / f0), count)).astype(int))
+        bands.append((f0, harmonics))
+        f0 = f0 * k_max / k_min
+    return bands
+
+
+def aligned_base_frequency(f0, samples, periods, clock):
+    """Closest base frequency for which `periods` periods are sampled with `samples` samples at clock/divider"""
+    divider = max(int(round(clock / (f0 * samples / periods))), 1)
+    return clock / divider * periods / samples
+
+
+def multisine(samples, harmonics):
+    """Sum of the given harmonics with Schroeder phases (low crest factor), normalized to a peak of 1"""
+    t = np.arange(samples) / samples
+    phases = -np.pi * np.arange(len(harmonics)) * (np.arange(len(harmonics)) - 1) / len(harmonics)
+    signal = np.sum(np.cos(2 * np.pi * np.outer(harmonics, t) + phases[:, None]), axis=0)
+    return signal / np.max(np.abs(signal))
+
+
+def log_chirp(samples, k_start, k_stop):
+    """Exponential sweep from harmonic k_start to k_stop over one period, peak of 1"""
+    t = np.arange(samples) / samples
+    rate = np.log(k_stop / k_start)
+    return np.sin(2 * np.pi * k_start * (np.exp(rate * t) - 1.) / rate)
+
+
+def tf_at_bins(input, output, harmonics, periods=1):
+    """Gain (dB) and phase (rad) of output/input at the excited harmonics of a record of `periods` periods"""
+    bins = np.round(np.asarray(harmonics) * periods).astype(int)                                                       #periods is not exactly an integer if the sampling rate was rounded
+    in_spect = np.fft.rfft(input - np.mean(input))[bins]
+    out_spect = np.fft.rfft(output - np.mean(output))[bins]
+    return 20. * np.log10(np.abs(out_spect) / np.abs(in_spect)), np.angle(out_spect) - np.angle(in_spect)
+
+
+def compare_tf(reference_f, reference_g, reference_phi, f, g, phi):
+    """Interpolates (f, g, phi) on the reference frequencies it covers and returns the differences.
+
+    Phases are compared modulo 2 pi. Returns (frequencies, gain difference dB, phase difference rad).
+    """
+    reference_f, f = np.asarray(reference_f), np.asarray(f)
+    order = np.argsort(f)
+    f, g, phi = f[order], np.asarray(g)[order], np.unwrap(np.asarray(phi)[order])
+    covered = (reference_f >= f[0]) & (reference_f <= f[-1])
+    log_f = np.log10(reference_f[covered])
+    g_diff = np.interp(log_f, np.log10(f), g) - np.asarray(reference_g)[covered]
+    phi_diff = np.angle(np.exp(1j * (np.interp(log_f, np.log10(f), phi) - np.asarray(reference_phi)[covered])))
+    return reference_f[covered], g_diff, phi_diff
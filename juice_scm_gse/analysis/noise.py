@@ -19,3 +19,31 @@ def psd(waveforms,sampling_freq,window=True,removeMean=True):
         psd =  psd/len(waveforms) / (sampling_freq/len(waveforms[0]))
         return freq, psd
     return None
+
+
+class PsdAccumulator:
+    """Averages the PSD of snapshots as they arrive, add() each snapshot then result() gives the
+    same output as psd() on the whole list"""
+
+    def __init__(self, sampling_freq, removeMean=True):
+        self.sampling_freq = sampling_freq
+        self.removeMean = removeMean
+        self.count = 0
+        self.freq = None
+        self._sum = None
+        self._length = 0
+
+    def add(self, waveform):
+        spect = fft(waveform=waveform, sampling_frequency=self.sampling_freq, window=None, remove_mean=self.removeMean)
+        if self._sum is None:
+            self.freq = spect["f"]
+            self._sum = spect["mod"]**2
+            self._length = len(waveform)
+        else:
+            self._sum += spect["mod"]**2
+        self.count += 1
+
+    def result(self):
+        if not self.count:
+            return None
+        return self.freq, self._sum/self.count / (self.sampling_freq/self._length)
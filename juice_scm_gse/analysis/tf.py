@@ -1,3 +1,4 @@
+import functools
 import numpy as np
 from .fft import *
 import peakutils
@@ -36,3 +37,53 @@ def tf(input, output, sampling_freq, window=True, removeMean=True):
         freq = in_spect["f"]
         peaks = peakutils.indexes(in_spect["mod"], min_dist=4)
     return None
+
+
+def _phasor(samples, k):
+    """exp(-2j*pi*k*n/samples) for n < samples, as the outer product of two sqrt(samples) long exponentials"""
+    block = int(np.ceil(np.sqrt(samples)))
+    steps = np.arange(block)
+    outer = np.exp(-2j*np.pi*((k*block*steps) % samples)/samples)                                                       #integer modulo keeps the angles small
+    inner = np.exp(-2j*np.pi*((k*steps) % samples)/samples)
+    return np.outer(outer, inner).ravel()[:samples]
+
+
+def _kernel(samples, k, window, scale_factor=None):
+    """DFT weights of bin k including the window, and the fft() scale factor for this window"""
+    weights = _phasor(samples, k)
+    if window is None:
+        return weights, 1./samples
+    if scale_factor is None:
+        scale_factor = 1./samples/np.sqrt(np.mean(np.square(window)))
+    return weights*window, scale_factor
+
+
+@functools.lru_cache(maxsize=16)
+def _hanning(samples):
+    """The window only depends on the record length, the bin changes at every point of a sweep"""
+    window = np.hanning(samples)
+    return window, 1./samples/np.sqrt(np.mean(np.square(window)))
+
+
+def demodulate(waveforms, sampling_frequency, frequency, window=True, remove_mean=True):
+    """Single bin DFT at the bin closest to frequency, for one or several channels at once.
+
+    waveforms is (samples) or (channels x samples), window is True (Hanning), None or an array.
+    Same mean removal, window correction and scaling as fft(), so mod and phi equal
+    fft(...)["mod"][k] and fft(...)["phi"][k] for the bin k, for the cost of one vector product
+    instead of a full FFT per channel.
+    Returns a dict with f (the bin frequency), mod and phi (one value per channel).
+    """
+    waveforms = np.atleast_2d(waveforms)
+    samples = waveforms.shape[1]
+    k = int(round(frequency * samples / sampling_frequency))
+    if window is True:
+        weights, scale_factor = _kernel(samples, k, *_hanning(samples))
+    else:
+        weights, scale_factor = _kernel(samples, k, window)
+    spectrum = waveforms @ weights
+    if remove_mean:                                                                                                     #(x - mean) @ weights = x @ weights - mean * sum(weights)
+        spectrum = spectrum - np.mean(waveforms, axis=1)*weights.sum()
+    spectrum = spectrum * scale_factor
+    frequency = sampling_frequency/2. if k == samples//2 else k * (1.0/(samples*(1/sampling_frequency)))            #as np.fft.fftfreq
+    return {"f": frequency, "mod": np.abs(spectrum), "phi": np.angle(spectrum, False)}
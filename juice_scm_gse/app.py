@@ -9,19 +9,19 @@ import zmq, json
 from datetime import datetime
 
 from PySide2.QtGui import QValidator, QRegExpValidator
-from PySide2.QtWidgets import QMainWindow, QApplication, QWidget, QMessageBox
-from PySide2.QtCore import Signal, QThread, Slot, QObject, QMetaObject, QGenericArgument, Qt
+from PySide2.QtWidgets import QMainWindow, QApplication, QWidget, QMessageBox, QDockWidget, QVBoxLayout, QLabel, QPushButton
+from PySide2.QtCore import Signal, QThread, Slot, QObject, QMetaObject, QGenericArgument, Qt, QSocketNotifier, QTimer
 #from juice_scm_gse.arduino_monitor import alimManagement
 #from juice_scm_gse.discovery_driver import do_measurements, turn_on_psu, turn_off_psu
-import numpy as np
 import juice_scm_gse.config as cfg
 from juice_scm_gse.gui.settings_pannel import SettingsPannel
 from juice_scm_gse.gui.progress_pannel import ProgressPannel
+from juice_scm_gse.gui.lcd_renderer import LcdRenderer
 from juice_scm_gse.gui.mainwindow import Ui_MainWindow
 from juice_scm_gse import config
-from juice_scm_gse.utils import list_of_floats, ureg, Q_, mkdir
-from juice_scm_gse.utils.mail import send_mail
-import psutil
+from juice_scm_gse.arduino_monitor.protocol import unpack_frames
+from juice_scm_gse.calibration import load_calibration
+from juice_scm_gse.utils import list_of_floats, mkdir
 
 import logging as log
 
@@ -38,14 +38,36 @@ StartupNotify=true
 Categories=Utility;Application;"""
 
 
-class VoltagesWorker(QThread):
+class ZmqSubscriberWorker(QThread):
+    """Thread whose event loop is woken up by the ZMQ socket file descriptor, no polling.
+
+    Running a real event loop also lets queued slots (startAlims...) execute in this thread.
+    handler is called once per message waiting on self.sock.
+    """
+
+    def __init__(self, handler):
+        QThread.__init__(self)
+        self.handler = handler
+
+    def run(self):
+        notifier = QSocketNotifier(self.sock.getsockopt(zmq.FD), QSocketNotifier.Read)
+        notifier.activated.connect(self._drain, Qt.DirectConnection)
+        self._drain()                                                                                                   #the ZMQ fd is edge triggered, messages may already be waiting
+        self.exec_()
+
+    def _drain(self, *args):
+        while self.sock.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+            self.handler()
+
+
+class VoltagesWorker(ZmqSubscriberWorker):
     updateVoltages = Signal(dict)
     restartDisco = Signal()
     signalUpdatePower = Signal(bool)
 
 
     def __init__(self, port=9990, portPair=9991):
-        QThread.__init__(self)                                                                                          #Creat a thread
+        ZmqSubscriberWorker.__init__(self, self.handle_message)                                                         #Creat a thread
         self.context = zmq.Context()                                                                                    #Initialize ZMQ
         self.sock = self.context.socket(zmq.SUB)                                                                        #Configure it as Subscriber (mode Publish/Subscribe)
         self.sock.connect(f"tcp://localhost:{port}")
@@ -55,6 +77,7 @@ class VoltagesWorker(QThread):
         self.sockPair.connect(f"tcp://localhost:{portPair}")
 
         self.alimsEnabled = False
+        self.calibration = load_calibration()
 
     def asics(self, asic="XXX"):
 
@@ -80,118 +103,86 @@ class VoltagesWorker(QThread):
         self.signalUpdatePower.emit(self.alimsEnabled)
 
 
+    def acknowledgeAlarms(self):
+        self.sockPair.send(b"Acknowledge alarms")
+
     def __del__(self):
         del self.sock
         del self.sockPair
         del self.context
 
 
-    def run(self):
-        while True:
-            try:
-                string = self.sock.recv(flags=zmq.NOBLOCK)                                                              #Recieve the Voltages
-                topic, data = string.split()
-                values = data.decode().split(',')
-                values = {                                                                                              #??? damn tricky
-                    key: float(value) for key, value in zip(
-                        ["VDD_CHX", "M_CHX", "V_BIAS_LNA_CHX", "S_CHX", "RTN_CHX",
-                         "VDD_CHY", "M_CHY", "V_BIAS_LNA_CHY", "S_CHY", "RTN_CHY",
-                         "VDD_CHZ", "M_CHZ", "V_BIAS_LNA_CHZ", "S_CHZ", "RTN_CHZ",
-                         "ADC_VDD_CHX", "ADC_M_CHX", "ADC_V_BIAS_LNA_CHX", "ADC_S_CHX", "ADC_RTN_CHX",
-                         "ADC_VDD_CHY", "ADC_M_CHY", "ADC_V_BIAS_LNA_CHY", "ADC_S_CHY", "ADC_RTN_CHY",
-                         "ADC_VDD_CHZ", "ADC_M_CHZ", "ADC_V_BIAS_LNA_CHZ", "ADC_S_CHZ", "ADC_RTN_CHZ",
-                         "CONSO_CHX", "CONSO_CHY", "CONSO_CHZ",
-                         "ALIM_CHX", "ALIM_CHY", "ALIM_CHZ"],
-                        values[1:])
-                }
-                for key, value in values.items():
-                    if "VDD" in key:
-                        if "ADC" in key:
-                            values[key] = (6.0 + 0.023) / 4096. * value
-                        else:
-                            values[key] = (6.0 + 0.023) / 1024. * value
-
-                    elif "CONSO" in key:
-                        values[key] = value / 1000.
-
-                    elif "ALIM" in key:
-                        values[key] = value / 1000.
-                    else:
-                        if "ADC" in key:
-                            values[key] = 5. / 4096. * value
-                        else:
-                            values[key] = 5. / 1024. * value
-
-                for ch in ["X", "Y", "Z"]:
-                    values[f"Offset_S_CH{ch}"] = values[f"S_CH{ch}"] - values[f"M_CH{ch}"]
-                    values[f"Offset_RTN_CH{ch}"] = values[f"RTN_CH{ch}"] - values[f"M_CH{ch}"]
-                    values[f"ADC_Offset_S_CH{ch}"] = values[f"ADC_S_CH{ch}"] - values[f"ADC_M_CH{ch}"]
-                    values[f"ADC_Offset_RTN_CH{ch}"] = values[f"ADC_RTN_CH{ch}"] - values[f"ADC_M_CH{ch}"]
-
-                self.updateVoltages.emit(values)                                                                        #MAJ Voltages
-
-            except zmq.ZMQError:
-                pass
-            if self.isInterruptionRequested():
-                return
-            QThread.msleep(10)
-            QApplication.processEvents()
+    def handle_message(self):
+        try:
+            topic, timestamp, frames = unpack_frames(self.sock.recv_multipart(flags=zmq.NOBLOCK, copy=False))         #Recieve the Voltages
+            values = self.calibration.as_dict(frames[0])
+
+            self.updateVoltages.emit(values)                                                                            #MAJ Voltages
 
+        except (zmq.ZMQError, ValueError):
+            pass
 
-class ArduinoStatusWorker(QThread):
+
+class ArduinoStatusWorker(ZmqSubscriberWorker):
     updateStatus = Signal(str)
+    updateAlarms = Signal(list)
 
     def __init__(self, port=9990):
-        QThread.__init__(self)
+        ZmqSubscriberWorker.__init__(self, self.handle_message)
         self.context = zmq.Context()
         self.sock = self.context.socket(zmq.SUB)
         self.sock.connect(f"tcp://localhost:{port}")
         self.sock.setsockopt(zmq.SUBSCRIBE, b"Status")
-        self.arduino_process = None
-        self.arduino_process_started = False
-
+        self.sock.setsockopt(zmq.SUBSCRIBE, b"Stats")                                                                   #latched alarms
+        from juice_scm_gse.utils.supervisor import Supervisor
+        self.supervisor = Supervisor()
+        if os.path.exists('arduino_monitor.py'):                                                                        #If "arduino_monitor.py" existe create a subprocess using it
+            command = ['python', 'arduino_monitor.py']
+        else:
+            command = ['Juice_Ardiuno_Monitor']
+        self.monitor = self.supervisor.add("arduino_monitor", command,
+                                           heartbeat_endpoint=f"tcp://localhost:{port}", heartbeat_topic=b"Stats")
+        if cfg.supervise_discovery.get() == 'True':
+            self.supervisor.add("discovery_driver", ['Juice_Discovery_Driver'])
+        self.lastStatus = "unknown"
 
     def __del__(self):
         del self.sock
         del self.context
 
-    def _arduino_process_is_alive(self):
-        if self.arduino_process is None:
-            return False
-        if self.arduino_process.poll() is None:
-            return True
-        return False
-
     def start(self):
-        if not self.arduino_process_started or not self._arduino_process_is_alive():
-            for proc in psutil.process_iter():
-                # check whether the process name matches
-                if 'arduino_monitor.py' in proc.cmdline():
-                    proc.kill()                                                                                         #If the process exist kill it to start clean
-            if os.path.exists('arduino_monitor.py'):                                                                    #If "arduino_monitor.py" existe create a subprocess using it
-                self.arduino_process = subprocess.Popen(['python', 'arduino_monitor.py'])                               #???
-            else:
-                self.arduino_process = subprocess.Popen(['Juice_Ardiuno_Monitor'])
-            self.arduino_process_started = True
+        if not self.supervisor.is_alive():
+            self.supervisor.start()                                                                                     #kills stale instances found through their pidfile, then starts and watches them
         QThread.start(self)
 
     def stop(self):
-        if self.arduino_process_started:
-            self.arduino_process_started = False
-            self.arduino_process.kill()
+        self.supervisor.stop()
+
+    def handle_message(self):
+        try:
+            string = self.sock.recv(flags=zmq.NOBLOCK)                                                                  #recieve msgs
+            topic, data = string.split(b' ', 1)
+            if topic == b"Stats":
+                self.updateAlarms.emit(json.loads(data)["alarms"])
+            else:
+                self.lastStatus = data.decode()
+                self.emit_status()
+        except zmq.ZMQError:
+            pass
+
+    def emit_status(self):
+        status = self.supervisor.status()["arduino_monitor"]
+        state = self.lastStatus if status["alive"] else "not running"
+        self.updateStatus.emit(f"Temperatures and Voltages monitor: {state} "
+                               f"(restarts: {status['restarts']}, uptime: {status['uptime']:.0f}s)")
 
     def run(self):
-        while True:
-            try:
-                string = self.sock.recv(flags=zmq.NOBLOCK)                                                              #recieve msgs
-                topic, data = string.split()
-                self.updateStatus.emit("Temperatures and Voltages monitor: " + data.decode())
-            except zmq.ZMQError:
-                pass
-            if self.isInterruptionRequested():
-                self.stop()
-                return
-            QThread.msleep(10)
+        refresh = QTimer()                                                                                              #restarts and uptime change without any Status message
+        refresh.timeout.connect(self.emit_status, Qt.DirectConnection)
+        refresh.start(1000)
+        ZmqSubscriberWorker.run(self)
+        refresh.stop()
+        self.stop()
 
 
 
@@ -200,8 +191,9 @@ class ApplicationWindow(QMainWindow):
     Launch_Measurements = Signal(str)
     burninStep = "None"
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, start_workers=True):                                                               #start_workers=False builds the window only (profiling)
         super(ApplicationWindow, self).__init__(parent)
+        self.startWorkers = start_workers
         self.settings_ui = SettingsPannel()
         self.progress_pannel = ProgressPannel()
         self.ui = Ui_MainWindow()
@@ -211,6 +203,17 @@ class ApplicationWindow(QMainWindow):
         self.acknowledgedAsicID = False
         self.asicPowered = False
         self.asicFileName = ""
+        self.asicRecorder = None
+        self.recorderStatus = QLabel()
+        self.ui.statusbar.addPermanentWidget(self.recorderStatus)
+        self.alarmsStatus = QLabel()
+        self.ui.statusbar.addPermanentWidget(self.alarmsStatus)
+        self.acknowledgeButton = QPushButton("Acknowledge alarms")
+        self.acknowledgeButton.setEnabled(False)
+        self.ui.statusbar.addPermanentWidget(self.acknowledgeButton)
+        self.recorderStatusTimer = QTimer(self)
+        self.recorderStatusTimer.timeout.connect(self._update_recorder_status)
+        self.recorderStatusTimer.start(1000)
         self.path = cfg.global_workdir.get() + "/ASICs"
         mkdir(self.path)  # create a "monitor" file in the working directory
         self.measuementRequested = False
@@ -226,18 +229,25 @@ class ApplicationWindow(QMainWindow):
 #        self.tempWorker.moveToThread(self.tempWorker)
 
         self.ui.pathWorkDir.setText(cfg.global_workdir.get())
+        self.lcdRenderer = self._build_lcd_renderer()
 
         self.arduinoStatusWorker = ArduinoStatusWorker()
         self.arduinoStatusWorker.updateStatus.connect(self.ui.statusbar.showMessage)
-        self.arduinoStatusWorker.start()
-        self.arduinoStatusWorker.moveToThread(self.arduinoStatusWorker)
+        self.arduinoStatusWorker.updateAlarms.connect(self.updateAlarms)
+        if start_workers:
+            self.arduinoStatusWorker.start()
+            self.arduinoStatusWorker.moveToThread(self.arduinoStatusWorker)
 
         self.voltagesWorker = VoltagesWorker()
         self.voltagesWorker.updateVoltages.connect(self.updateVoltages)
         self.voltagesWorker.updateVoltages.connect(self.asicRecording)
-        self.voltagesWorker.start()
-        self.voltagesWorker.moveToThread(self.voltagesWorker)
+        self._build_charts()
+        self._build_bench_overview()
+        if start_workers:
+            self.voltagesWorker.start()
+            self.voltagesWorker.moveToThread(self.voltagesWorker)
         self.ui.power_button.clicked.connect(self.voltagesWorker.startAlims, Qt.QueuedConnection)
+        self.acknowledgeButton.clicked.connect(self.voltagesWorker.acknowledgeAlarms, Qt.QueuedConnection)
         self.voltagesWorker.signalUpdatePower.connect(self.updatePowerButton)
         self.ui.asicSN.setValidator(QRegExpValidator("[0-9]{3}"))                                                       #3 Chifre
         self.ui.asicSN.returnPressed.connect(lambda: print("Declenché"))                                                #test
@@ -272,18 +282,34 @@ class ApplicationWindow(QMainWindow):
 
 
     def __del__(self):
-        for thr in [self.arduinoStatusWorker, self.voltagesWorker]:
-            thr.requestInterruption()
-            while thr.isRunning():
-                QThread.msleep(10)
+        self.shutdown()
 #        del self.discoWorker
         del self.arduinoStatusWorker
 #        del self.tempWorker
         del self.voltagesWorker
         self.close()
 
-    # def closeEvent(self, event:PySide2.QtGui.QCloseEvent):
-    #     self.voltagesWorker.startAlims("Disable")
+    def shutdown(self):
+        """Stops the workers and the supervisor and closes the ASIC recording, only the first call does something"""
+        if getattr(self, "isShutdown", False):
+            return
+        self.isShutdown = True
+        self.recorderStatusTimer.stop()
+        for thr in [self.arduinoStatusWorker, self.voltagesWorker]:
+            thr.quit()
+            thr.wait()
+        self.arduinoStatusWorker.stop()                                                                                 #supervisor and monitor
+        if self.benchesWorker is not None:
+            self.benchesWorker.stop()
+        if self.asicRecorder is not None:
+            self.asicRecorder.close()
+            self.asicRecorder.join()
+            self.asicRecorder = None
+
+    def closeEvent(self, event):
+        # self.voltagesWorker.startAlims("Disable")
+        self.shutdown()
+        event.accept()
 
 
     #    def updateTemperatures(self, tempA, tempB, tempC):
@@ -300,7 +326,7 @@ class ApplicationWindow(QMainWindow):
                                                 QMessageBox.Yes | QMessageBox.No)
             if choice == QMessageBox.Yes:
                 self.acknowledgedAsicID = True
-                self.asicFileName = f"{self.path}/ASIC_JUICEMagic3_SN_{asicID}-{str(datetime.now())}.txt"  # create a file with the current date to dump the data
+                self.asicFileName = f"{self.path}/ASIC_JUICEMagic3_SN_{asicID}-{str(datetime.now())}"  # create a recording with the current date to dump the data
                 print(self.asicFileName)
                 self.voltagesWorker.asics(asicID)
                 self.ui.asicSN.setStyleSheet("QLineEdit {background-color: green;}")
@@ -323,7 +349,7 @@ class ApplicationWindow(QMainWindow):
                 self.ui.asicsListe.clear()                                                                              #Sauvage mais fonctionne
                 self.ui.asicsListe.addItems(self.asicsList[::-1])
                 self.acknowledgedAsicID = True
-                self.asicFileName = f"{self.path}/ASIC_JUICEMagic3_SN_{asicID}_{self.burninStep}-{str(datetime.now())}.txt"  # create a file with the current date to dump the data
+                self.asicFileName = f"{self.path}/ASIC_JUICEMagic3_SN_{asicID}_{self.burninStep}-{str(datetime.now())}"  # create a recording with the current date to dump the data
                 print(self.asicFileName)
                 self.voltagesWorker.asics(f"{asicID}_{self.burninStep}")
                 self.ui.asicSN.setStyleSheet("QLineEdit {background-color: green;}")
@@ -348,6 +374,21 @@ class ApplicationWindow(QMainWindow):
 
 
 
+    def _start_asic_recorder(self, columns):
+        from juice_scm_gse.utils.recorder import BackgroundRecorder
+        if self.asicRecorder is not None:
+            self.asicRecorder.close()
+        metadata = {"asic": os.path.basename(self.asicFileName), "burnin_step": self.burninStep,
+                    **self.voltagesWorker.calibration.metadata()}
+        self.asicRecorder = BackgroundRecorder(self.asicFileName, columns, metadata=metadata)
+        self.asicRecorder.start()
+
+    def _update_recorder_status(self):
+        if self.asicRecorder is not None:
+            self.recorderStatus.setText(f"Recorder queue: {self.asicRecorder.queue_depth}, "
+                                        f"write: {self.asicRecorder.write_latency * 1e3:.1f}ms "
+                                        f"(max {self.asicRecorder.max_write_latency * 1e3:.1f}ms)")
+
     def asicRecording(self, values):
         if self.acknowledgedAsicID and self.asicPowered:
             self.ui.asicSN.setDisabled(True)
@@ -356,13 +397,9 @@ class ApplicationWindow(QMainWindow):
             if self.measuementRequested:
                 self.ui.Launch_Measurements.setDisabled(True)
                 self.ui.Launch_Measurements.setStyleSheet('QPushButton {background-color: #69ff69;}')
-                with open(self.asicFileName, 'a') as out:
-                    out.write(str(datetime.now()) + '\t')
-                    for channel, value in values.items():
-                        out.write(f"{channel}: {value}, ")
-
-                    out.write('\n')
-                    print("recording")
+                if self.asicRecorder is None or self.asicRecorder.path != self.asicFileName:
+                    self._start_asic_recorder(values.keys())
+                self.asicRecorder.append(datetime.now().timestamp(), list(values.values()))
         else:
             self.ui.Launch_Measurements.setStyleSheet('')
             self.ui.Launch_Measurements.setDisabled(True)
@@ -371,25 +408,54 @@ class ApplicationWindow(QMainWindow):
             self.ui.asicsListe.setEnabled(True)
 
 
+    def updateAlarms(self, alarms):
+        self.alarmsStatus.setText(f"Alarms: {', '.join(alarms)}" if alarms else "")
+        self.alarmsStatus.setStyleSheet('QLabel {background-color: red;}' if alarms else '')
+        self.acknowledgeButton.setEnabled(bool(alarms))
+
     def updateVoltages(self, values):
         if self.measuementRequested:
-            for ch in ["X", "Y", "Z"]:
-                self.ui.__dict__[f"CH{ch}_VDD"].display(values[f"VDD_CH{ch}"])
-                self.ui.__dict__[f"CH{ch}_BIAS"].display(values[f"V_BIAS_LNA_CH{ch}"])
-                self.ui.__dict__[f"CH{ch}_M"].display(values[f"M_CH{ch}"])
-                self.ui.__dict__[f"CH{ch}_RTN"].display(values[f"RTN_CH{ch}"])
-                self.ui.__dict__[f"CH{ch}_S"].display(values[f"S_CH{ch}"])
-                # self.ui.__dict__[f"CH{ch}_Offset_RTN"].display(values[f"Offset_RTN_CH{ch}"])
-                # self.ui.__dict__[f"CH{ch}_Offset_S"].display(values[f"Offset_S_CH{ch}"])
-                self.ui.__dict__[f"CH{ch}_I"].display(values[f"CONSO_CH{ch}"])
-                self.ui.__dict__[f"CH{ch}_V"].display(values[f"ALIM_CH{ch}"])
-                self.ui.__dict__[f"CH{ch}_VDD_ADC"].display(values[f"ADC_VDD_CH{ch}"])
-                self.ui.__dict__[f"CH{ch}_BIAS_ADC"].display(values[f"ADC_V_BIAS_LNA_CH{ch}"])
-                self.ui.__dict__[f"CH{ch}_M_ADC"].display(values[f"ADC_M_CH{ch}"])
-                self.ui.__dict__[f"CH{ch}_RTN_ADC"].display(values[f"ADC_RTN_CH{ch}"])
-                self.ui.__dict__[f"CH{ch}_S_ADC"].display(values[f"ADC_S_CH{ch}"])
-                # self.ui.__dict__[f"CH{ch}_Offset_RTN_ADC"].display(values[f"ADC_Offset_RTN_CH{ch}"])
-                # self.ui.__dict__[f"CH{ch}_Offset_S_ADC"].display(values[f"ADC_Offset_S_CH{ch}"])
+            self.lcdRenderer.update(values)
+
+    def _build_charts(self):
+        from juice_scm_gse.gui.strip_chart import StripChart
+        span = float(cfg.gui_chart_span.get())
+        self.charts = [StripChart([f"VDD_CH{ch}", f"V_BIAS_LNA_CH{ch}", f"M_CH{ch}", f"S_CH{ch}", f"RTN_CH{ch}"],
+                                  title=f"CH{ch} (V)", span=span) for ch in ["X", "Y", "Z"]]
+        self.charts.append(StripChart(["CONSO_CHX", "CONSO_CHY", "CONSO_CHZ"], title="Currents (mA)", span=span))
+        container = QWidget()
+        layout = QVBoxLayout(container)
+        for chart in self.charts:
+            layout.addWidget(chart)
+            self.voltagesWorker.updateVoltages.connect(chart.add_values)
+        dock = QDockWidget("History", self)
+        dock.setWidget(container)
+        self.addDockWidget(Qt.RightDockWidgetArea, dock)
+
+    def _build_bench_overview(self):
+        self.benchesWorker = None
+        if not cfg.bench_endpoints.get():
+            return
+        from juice_scm_gse.gui.bench_overview import BenchesWorker, BenchOverview                                       #only imported when benches are configured
+        self.benchesWorker = BenchesWorker(rate=float(cfg.gui_display_rate.get()),
+                                           record=cfg.bench_record.get() == 'True')
+        overview = BenchOverview()
+        self.benchesWorker.updateBenches.connect(overview.update_benches)
+        dock = QDockWidget("Benches", self)
+        dock.setWidget(overview)
+        self.addDockWidget(Qt.BottomDockWidgetArea, dock)
+        if self.startWorkers:
+            self.benchesWorker.start()
+
+    def _build_lcd_renderer(self):
+        widgets = {}
+        for ch in ["X", "Y", "Z"]:
+            for widget, key in [("VDD", "VDD"), ("BIAS", "V_BIAS_LNA"), ("M", "M"), ("RTN", "RTN"), ("S", "S"),
+                                ("I", "CONSO"), ("V", "ALIM"),
+                                ("VDD_ADC", "ADC_VDD"), ("BIAS_ADC", "ADC_V_BIAS_LNA"), ("M_ADC", "ADC_M"),
+                                ("RTN_ADC", "ADC_RTN"), ("S_ADC", "ADC_S")]:
+                widgets[f"{key}_CH{ch}"] = self.ui.__dict__[f"CH{ch}_{widget}"]
+        return LcdRenderer(widgets, rate=float(cfg.gui_display_rate.get()), parent=self)
 
 
     def updatePowerButton(self, powered):
@@ -437,6 +503,7 @@ class ApplicationWindow(QMainWindow):
 </body>
 </html> 
         '''
+        from juice_scm_gse.utils.mail import send_mail
         send_mail(server=config.mail_server.get(), sender="juicebot@lpp.polytechnique.fr",
                   recipients=config.mail_recipients.get(), subject="Starting measurement", html_body=html,
                   username=config.mail_login.get(), password=config.mail_password.get(), port=465, use_tls=True)
@@ -445,6 +512,39 @@ class ApplicationWindow(QMainWindow):
         self.close()
 
 
+def profile_startup(args, top=15):
+    """Reports the import time of what this module pulls in and the window construction time.
+
+    The window is built without its workers, profiling must not restart the live monitor.
+    """
+    import time
+    report = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import juice_scm_gse.app'],
+                            stderr=subprocess.PIPE, universal_newlines=True).stderr
+    imports = []
+    for line in report.splitlines():
+        try:
+            _, cumulative, name = line[len("import time:"):].split('|')
+            cumulative = int(cumulative)
+        except ValueError:
+            continue
+        if len(name) - len(name.lstrip()) <= 3:                                                                         #juice_scm_gse.app and its direct imports
+            imports.append((cumulative, name.strip()))
+    for cumulative, name in sorted(imports, reverse=True)[:top]:
+        print(f"import {name:<45} {cumulative / 1e3:8.1f} ms")
+    start = time.perf_counter()
+    app = QApplication(args)
+    created = time.perf_counter()
+    application = ApplicationWindow(start_workers=False)
+    constructed = time.perf_counter()
+    application.show()
+    app.processEvents()
+    shown = time.perf_counter()
+    print(f"QApplication                                         {(created - start) * 1e3:8.1f} ms")
+    print(f"ApplicationWindow()                                  {(constructed - created) * 1e3:8.1f} ms")
+    print(f"show                                                 {(shown - constructed) * 1e3:8.1f} ms")
+    application.close()
+
+
 def main(args=sys.argv):
     lib_dir = os.path.dirname(os.path.realpath(__file__))
     bin_dir = lib_dir + "/../../../../bin"
@@ -456,8 +556,12 @@ def main(args=sys.argv):
     log.basicConfig(filename=f'{config.log_dir()}/gui-{datetime.now()}.log', format='%(asctime)s - %(message)s',
                     level=log.INFO)
     log.getLogger().addHandler(log.StreamHandler(sys.stdout))
+    if "--profile-startup" in args:
+        profile_startup([arg for arg in args if arg != "--profile-startup"])
+        return
     app = QApplication(args)
     application = ApplicationWindow()
+    app.aboutToQuit.connect(application.shutdown)                                                                       #also when quitting without closing the window
     application.show()
     sys.exit(app.exec_())
 
@@ -1,10 +1,20 @@
-import serial, time, datetime
+import os, sys, serial, time, datetime, json, argparse, signal
 import zmq
-from glob import glob
+import numpy as np
 import juice_scm_gse.config as cfg
 from  juice_scm_gse.utils import mkdir
 #import atexit
 from re import search
+from threading import Thread, Lock, Event
+from juice_scm_gse.utils.recorder import ChunkedRecorder
+from juice_scm_gse.utils.supervisor import hold_pidfile
+from .parser import FrameParser, FRAME_COLUMNS, VOLTAGES_COUNT, read_block
+from .ring_buffer import FrameRingBuffer
+from .protocol import send_frames
+from .hotplug import DeviceWatcher, find_port
+from .stats import WindowStatistics
+from .limits import LimitEngine, limits_from_config
+from juice_scm_gse.calibration import load_calibration
 
 
 def setup_ipc(port=9990, portPair=9991):
@@ -18,35 +28,38 @@ def setup_ipc(port=9990, portPair=9991):
 
 
 
-def setup_serial(socket, port_regex='/dev/ttyACM[0-1]', baudrate=2000000):                                              #Get the Arduino data via the serial communication
-    socket.send(f"Status disconnected".encode())
-    while True:
-        print("try to connect")
-        try:
-            port = glob(port_regex)
-            if len(port):
-                com = serial.Serial(port=port[0], baudrate=baudrate)
-                if com.is_open:
-                    com = serial.Serial(port=port[0], baudrate=baudrate)
-                    socket.send(f"Status connected".encode())
-                    print("Connected")
-                    return com
-        except serial.serialutil.SerialException:
-            pass
-        time.sleep(1.)
+def setup_serial(notify_status, port_regex='/dev/ttyACM[0-1]', baudrate=2000000, serial_number=None):             #Get the Arduino data via the serial communication
+    notify_status("disconnected")
+    print("try to connect")
+    with DeviceWatcher(os.path.dirname(port_regex)) as watcher:
+        while True:
+            port = find_port(port_regex, serial_number)
+            if port is not None:
+                try:
+                    com = serial.Serial(port=port, baudrate=baudrate)
+                    if com.is_open:
+                        notify_status("connected")
+                        print("Connected")
+                        return com
+                except serial.serialutil.SerialException:
+                    pass                                                                                                #node is there but udev may not be done yet
+            watcher.wait(1. if port is None else 0.05)
 
 
 def exit_handler():
-    socket = setup_ipc()
-    ser = setup_serial(socket)
+    socket, _ = setup_ipc()
+    ser = setup_serial(lambda status: socket.send(f"Status {status}".encode()))
     message = f"Disable alims"
     ser.write(message.encode())
 
 
 def reset_and_flush(ser):
     ser.read_all()
-    ser.setDTR(1)
-    ser.setDTR(0)
+    try:
+        ser.setDTR(1)
+        ser.setDTR(0)
+    except OSError:
+        pass                                                                                                            #no modem control lines (pseudo-terminal), nothing to reset
     time.sleep(0.5)
     ser.read_all()
 
@@ -54,81 +67,253 @@ def reset_and_flush(ser):
 #atexit.register(exit_handler)
 
 
-def main():
-    socket, sockPair = setup_ipc()
-    ser = setup_serial(socket)
-    nbrIteration = 0
-    #atexit.register(exit_handler)
-    if ser.is_open:
-        path = cfg.global_workdir.get()+"/monitor"
-        mkdir(path)                                                                                                     #create a "monitor" file in the working directory
-        fname = f"{path}/all-{str(datetime.datetime.now())}.txt"                                                        #create a file with the current date to dump the data
-        print(fname)
-        with open(fname, 'w') as out:
-            reset_and_flush(ser)
-
-            out.write(ser.readline().decode())  # comment line
-            out.write(ser.readline().decode())  # header columns names
-            last_publish = time.time()
-            while True:
-                try:
-                    msg = sockPair.recv(flags=zmq.NOBLOCK)
-                    msg = msg.decode("utf-8")
-                    if "alim" in msg:
-                        ser.write(f"{msg}".encode())
+class SerialReader(Thread):
+    """Only reads the serial link and fills the ring buffer, everything else is done by consumers"""
 
-                    if "ASIC_JUICEMagic3" in msg:
-                        out.write(msg + '\n')
+    def __init__(self, ring: FrameRingBuffer, port_regex='/dev/ttyACM[0-1]', baudrate=2000000, serial_number=None):
+        Thread.__init__(self, daemon=True)
+        self.ring = ring
+        self.port_regex = port_regex
+        self.baudrate = baudrate
+        self.serial_number = serial_number
+        self.parser = FrameParser(ring.columns)
+        self.status = "disconnected"
+        self.reconnections = 0
+        self.ser = None
+        self._write_lock = Lock()
 
-                except zmq.ZMQError:
-                    pass
+    def _set_status(self, status):
+        self.status = status
 
-                try:
-                    line = ser.readline().decode()                                                                      #get and decode the data on the serial communication
-                    out.write(str(datetime.datetime.now()) + '\t' + line)
-                    now = time.time()
+    def write(self, message: bytes):
+        with self._write_lock:
+            if self.ser is not None:
+                self.ser.write(message)
 
-                    values = line.split('\t')
+    def _connect(self):
+        ser = setup_serial(self._set_status, self.port_regex, self.baudrate, self.serial_number)
+        reset_and_flush(ser)
+        self.parser.reset()
+        for _ in range(2):                                                                                              #comment line and header columns names
+            self.ring.mark(ser.readline().decode(errors='replace').rstrip('\r\n'), time.time())
+        self.ser = ser
 
-                    for val in values:
-                        if "_CH" in val:
-                            nbrIteration = 0
+    def run(self):
+        self._connect()
+        while True:
+            try:
+                block = read_block(self.ser, self.parser)
+                now = time.time()
+                for header in block.headers:
+                    self.ring.mark(header.decode(errors='replace'), now)
+                self.ring.push(block.frames, now)
+            except (serial.serialutil.SerialException, OSError):                                                        #in_waiting is a raw ioctl, an unplug raises EIO there
+                with self._write_lock:
+                    self.ser.close()
+                    self.ser = None
+                self.reconnections += 1
+                self._connect()
 
-                    if nbrIteration == 0:                                                                               #la premiere iteration n'a que les entête
-                        pass
-                    elif nbrIteration == 1:
-                        valuesVoltage = values[:-1]
-                    else:
-                        valuesVoltage = [float(vOld) + float(vNew) for vOld, vNew in zip(valuesVoltage, values[:-1])]
 
-                    nbrIteration += 1
+def record_pending(cursor, recorder: ChunkedRecorder):
+    """Appends what the cursor has not read yet, events are marked at the row they occurred at"""
+    timestamps, frames, events = cursor.read_marked()
+    done = 0
+    for row, stamp, text in events:                                                                                     #headers and ASIC markers go to the side table
+        recorder.append(timestamps[done:row], frames[done:row])
+        recorder.mark(stamp, text)
+        done = row
+    recorder.append(timestamps[done:], frames[done:])
 
-                    if (now - last_publish) >= 0.33:                                                                    #Wait 0.3 second just because (old:temp measurments are slow)
-                        last_publish = now
 
-                        #values = line.split('\t')
-                        #tempA, tempB, tempC = float(values[-4]), float(values[-3]), float(values[-2])
-                        #tempA, tempB, tempC = float(10), float(11), float(12)
-                        #socket.send(f"Temperatures {now},{tempA},{tempB},{tempC}".encode())
+class Recorder(Thread):
+    def __init__(self, cursor, path, flush_period=10.):                                                                #partial chunks are written at most every flush_period
+        Thread.__init__(self, daemon=True)
+        self.cursor = cursor
+        self.recorder = ChunkedRecorder(path, FRAME_COLUMNS)
+        self.flush_period = flush_period
+        self._stopping = Event()
 
-                        message = f"Voltages {now}"
+    def run(self):
+        last_flush = time.time()
+        while not self._stopping.is_set():
+            self.cursor.wait(1.)
+            record_pending(self.cursor, self.recorder)
+            now = time.time()
+            if (now - last_flush) >= self.flush_period:
+                last_flush = now
+                self.recorder.flush()
+        record_pending(self.cursor, self.recorder)
+        self.recorder.close()
 
-                        for v in valuesVoltage:                                                                         #values[:-1] exept the last one
-                            v = float(v)
-                            if nbrIteration > 1:
-                                v = v / (nbrIteration-1)
-                            message += f",{v}"
+    def close(self):
+        """Writes what is left in the ring and closes the recording"""
+        self._stopping.set()
+        self.join()
 
-                        nbrIteration = 0
 
-                        socket.send(message.encode())
-                        out.flush()
+class CommandHandler(Thread):
+    def __init__(self, sockPair, reader: SerialReader, limits: LimitEngine = None):
+        Thread.__init__(self, daemon=True)
+        self.sockPair = sockPair
+        self.reader = reader
+        self.limits = limits
+        self.commands_count = 0
 
+    def run(self):
+        while True:
+            msg = self.sockPair.recv().decode("utf-8")
+            self.commands_count += 1
+            if "alim" in msg:
+                self.reader.write(f"{msg}".encode())
 
-                except serial.serialutil.SerialException:
-                    for _ in [None,None]:
-                        ser.close()
-                        ser = setup_serial(socket)
-                        reset_and_flush(ser)
-                        ser.readline(),ser.readline()
+            if "ASIC_JUICEMagic3" in msg:
+                self.reader.ring.mark(msg, time.time())
+
+            if msg == "Acknowledge alarms" and self.limits is not None:
+                self.limits.acknowledge()
+
+
+class RawPublisher(Thread):
+    """Publishes every frame in batches on its own PUB socket.
+
+    Each "Frames" message is a (rows x (1 + columns)) array, the first column being the frame
+    timestamp. The separate socket and its small high water mark make a slow subscriber drop
+    batches without affecting the decimated Voltages topic nor the producer.
+    """
+
+    def __init__(self, cursor, port=9994, high_water_mark=100, batch_period=0.05):
+        Thread.__init__(self, daemon=True)
+        self.cursor = cursor
+        self.port = port
+        self.high_water_mark = high_water_mark
+        self.batch_period = batch_period
+        self.batches = 0
+
+    def run(self):
+        sock = zmq.Context.instance().socket(zmq.PUB)
+        sock.setsockopt(zmq.SNDHWM, self.high_water_mark)
+        sock.bind(f"tcp://*:{self.port}")
+        while True:
+            time.sleep(self.batch_period)
+            self.cursor.wait(1.)
+            timestamps, frames = self.cursor.read()
+            if len(frames):
+                send_frames(sock, b"Frames", timestamps[-1], np.column_stack((timestamps, frames)))
+                self.batches += 1
+
+
+class Publisher:
+    """Averages what the cursor yields and publishes Status, Voltages, Statistics and Stats.
 
+    When a LimitEngine is given every frame is calibrated and checked, state changes are published
+    as "Alarms" and marked in the recording. Stats is the supervisor heartbeat, it stops as soon as
+    the reader is dead so a monitor that can no longer read gets restarted.
+    step() never blocks, so it can be driven by publish_loop or by an event loop.
+    """
+
+    def __init__(self, socket, cursor, reader, consumers, publish_period=0.33, stats_period=1.,
+                 limits: LimitEngine = None, calibration=None):
+        self.socket = socket
+        self.cursor = cursor
+        self.reader = reader
+        self.consumers = consumers
+        self.publish_period = publish_period
+        self.stats_period = stats_period
+        self.window = WindowStatistics(VOLTAGES_COUNT)
+        self.limits = limits
+        self.calibration = calibration or (load_calibration() if limits is not None else None)
+        self.status = None
+        self.last_publish = self.last_stats = time.time()
+
+    def step(self):
+        socket, window = self.socket, self.window
+        if self.status != self.reader.status:
+            self.status = self.reader.status
+            socket.send(f"Status {self.status}".encode())
+        if any(text.startswith('#') for _, _, _, text in self.cursor.read_events()):                                  #the Arduino restarted, drop what was accumulated so far
+            window.reset()
+        timestamps, frames = self.cursor.read()
+        window.add(frames)
+        if self.limits is not None and len(frames):
+            for event in self.limits.check(self.calibration.apply(frames), timestamps):
+                socket.send(f"Alarms {json.dumps(event)}".encode())
+                self.reader.ring.mark(f"ALARM {event['channel']} {event['state']} {event['value']:.6g}",
+                                      event['timestamp'])
+        now = time.time()
+        if (now - self.last_publish) >= self.publish_period and window.count:
+            self.last_publish = now
+            statistics = window.result()
+            send_frames(socket, b"Voltages", now, statistics[0])                                                       #the GUI only needs the mean
+            send_frames(socket, b"Statistics", now, statistics)                                                        #rows are STATISTICS_ROWS
+            window.reset()
+        if (now - self.last_stats) >= self.stats_period and self.reader.is_alive():
+            self.last_stats = now
+            socket.send(f"Stats {json.dumps(self.stats())}".encode())
+
+    def stats(self):
+        return {
+            "frames": self.reader.ring.written,
+            "dropped_lines": self.reader.parser.dropped_lines,
+            "reconnections": self.reader.reconnections,
+            "overflows": {consumer.name: consumer.overflows for consumer in self.consumers},
+            "alarms": self.limits.alarms() if self.limits is not None else []
+        }
+
+
+def terminate_on_sigterm():
+    """SIGTERM (sent by the supervisor) unwinds the main thread like Ctrl-C so recordings get closed"""
+    def handler(signum, frame):
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, handler)
+
+
+def publish_loop(socket, cursor, reader: SerialReader, consumers, publish_period=0.33, stats_period=1., limits=None):
+    publisher = Publisher(socket, cursor, reader, consumers, publish_period, stats_period, limits)
+    while True:
+        cursor.wait(publish_period)
+        publisher.step()
+
+
+def monitor_arguments(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--port", default='/dev/ttyACM[0-1]', help="serial port path or glob pattern")
+    parser.add_argument("--workdir", default=None, help="overrides the configured working directory")
+    parser.add_argument("--raw-port", type=int, default=None, help="publish every frame on this port")
+    return parser
+
+
+def raw_port(args):
+    if args.raw_port is not None:
+        return args.raw_port
+    if cfg.monitor_raw_frames.get() == 'True':                                                                          #full rate topic is opt-in
+        return int(cfg.monitor_raw_port.get())
+    return None
+
+
+def main(args=sys.argv[1:]):
+    args = monitor_arguments("Reads the Arduino monitor and publishes its frames").parse_args(args)
+    hold_pidfile("arduino_monitor")
+    socket, sockPair = setup_ipc()
+    ring = FrameRingBuffer()
+    reader = SerialReader(ring, port_regex=args.port, serial_number=cfg.monitor_serial_number.get() or None)
+    path = (args.workdir or cfg.global_workdir.get())+"/monitor"
+    mkdir(path)                                                                                                         #create a "monitor" file in the working directory
+    fname = f"{path}/all-{str(datetime.datetime.now())}"                                                                #create a recording directory with the current date to dump the data
+    print(fname)
+    recorder = Recorder(ring.cursor("recorder"), fname)
+    limits = limits_from_config()
+    commands = CommandHandler(sockPair, reader, limits)
+    publisher_cursor = ring.cursor("publisher")
+    threads = [recorder, commands, reader]
+    if raw_port(args) is not None:
+        threads.append(RawPublisher(ring.cursor("raw"), port=raw_port(args)))
+    for thread in threads:
+        thread.start()
+    consumers = [thread.cursor for thread in threads if hasattr(thread, "cursor")] + [publisher_cursor]
+    terminate_on_sigterm()
+    try:
+        publish_loop(socket, publisher_cursor, reader, consumers=consumers,
+                     publish_period=float(cfg.monitor_publish_period.get()), limits=limits)
+    finally:
+        recorder.close()
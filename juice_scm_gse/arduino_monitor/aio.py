@@ -0,0 +1,210 @@
+import sys, asyncio, time, datetime, signal
+from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+import serial
+import zmq, zmq.asyncio
+import numpy as np
+import juice_scm_gse.config as cfg
+from juice_scm_gse.utils import mkdir
+from juice_scm_gse.utils.recorder import ChunkedRecorder
+from juice_scm_gse.utils.supervisor import hold_pidfile
+from . import setup_serial, reset_and_flush, Publisher, monitor_arguments, raw_port, record_pending
+from .parser import FrameParser, FRAME_COLUMNS
+from .protocol import send_frames
+from .ring_buffer import FrameRingBuffer
+from .limits import limits_from_config
+
+
+def setup_ipc(port=9990, portPair=9991):
+    context = zmq.asyncio.Context()
+    sock = context.socket(zmq.PUB)
+    sock.bind(f"tcp://*:{port}")
+
+    sockPair = context.socket(zmq.PAIR)
+    sockPair.bind(f"tcp://*:{portPair}")
+    return sock, sockPair
+
+
+def run_in_daemon_thread(func):
+    """Like loop.run_in_executor(None, func) but asyncio.run does not wait for the thread at exit,
+    device detection may wait forever and must not block a SIGTERM shutdown"""
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+
+    def resolve(result, error):
+        if not future.done():
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def target():
+        try:
+            result, error = func(), None
+        except Exception as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(resolve, result, error)
+        except RuntimeError:
+            pass                                                                                                        #the loop is already closed
+    Thread(target=target, daemon=True).start()
+    return future
+
+
+class AsyncSerialReader:
+    """Event driven counterpart of SerialReader, data is read when the serial fd is readable"""
+
+    def __init__(self, ring: FrameRingBuffer, port_regex='/dev/ttyACM[0-1]', baudrate=2000000, serial_number=None):
+        self.ring = ring
+        self.port_regex = port_regex
+        self.baudrate = baudrate
+        self.serial_number = serial_number
+        self.parser = FrameParser(ring.columns)
+        self.status = "disconnected"
+        self.reconnections = 0
+        self.ser = None
+        self.data_ready = asyncio.Event()
+        self._disconnected = asyncio.Event()
+        self._running = False
+
+    def _set_status(self, status):
+        self.status = status
+
+    def write(self, message: bytes):
+        if self.ser is not None:
+            self.ser.write(message)
+
+    def _open(self):
+        ser = setup_serial(self._set_status, self.port_regex, self.baudrate, self.serial_number)
+        reset_and_flush(ser)
+        headers = [ser.readline().decode(errors='replace').rstrip('\r\n') for _ in range(2)]
+        ser.timeout = 0                                                                                                 #from now on reads never block, the loop tells us when data is there
+        return ser, headers
+
+    def _on_readable(self):
+        try:
+            block = self.parser.feed(self.ser.read(self.ser.in_waiting or 1))
+        except (serial.serialutil.SerialException, OSError):                                                            #in_waiting is a raw ioctl, a hang-up raises EIO there
+            self._disconnect()
+            return
+        now = time.time()
+        for header in block.headers:
+            self.ring.mark(header.decode(errors='replace'), now)
+        self.ring.push(block.frames, now)
+        if len(block.frames):
+            self.data_ready.set()
+
+    def is_alive(self):
+        return self._running
+
+    def _disconnect(self):
+        asyncio.get_event_loop().remove_reader(self.ser.fileno())
+        self.ser.close()
+        self.ser = None
+        self._disconnected.set()
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        self._running = True
+        try:
+            while True:
+                ser, headers = await run_in_daemon_thread(self._open)                                                  #device detection and Arduino reset are blocking
+                self.parser.reset()
+                for header in headers:
+                    self.ring.mark(header, time.time())
+                self.ser = ser
+                self._disconnected.clear()
+                loop.add_reader(ser.fileno(), self._on_readable)
+                await self._disconnected.wait()
+                self.reconnections += 1
+        finally:
+            self._running = False
+
+
+async def handle_commands(sockPair, reader: AsyncSerialReader, limits=None):
+    while True:
+        msg = (await sockPair.recv()).decode("utf-8")
+        if "alim" in msg:
+            reader.write(f"{msg}".encode())
+
+        if "ASIC_JUICEMagic3" in msg:
+            reader.ring.mark(msg, time.time())
+
+        if msg == "Acknowledge alarms" and limits is not None:
+            limits.acknowledge()
+
+
+async def publish(publisher: Publisher, reader: AsyncSerialReader):
+    while True:
+        try:
+            await asyncio.wait_for(reader.data_ready.wait(), publisher.publish_period)
+        except asyncio.TimeoutError:
+            pass
+        reader.data_ready.clear()
+        publisher.step()
+        await asyncio.sleep(publisher.publish_period / 4.)                                                             #let frames accumulate
+
+
+async def record(cursor, recorder: ChunkedRecorder, flush_period=10.):
+    loop = asyncio.get_event_loop()
+    writer = ThreadPoolExecutor(max_workers=1)                                                                          #keeps disk writes ordered and off the loop
+    last_flush = time.time()
+    try:
+        while True:
+            await asyncio.sleep(1.)
+            await loop.run_in_executor(writer, record_pending, cursor, recorder)
+            now = time.time()
+            if (now - last_flush) >= flush_period:
+                last_flush = now
+                await loop.run_in_executor(writer, recorder.flush)
+    finally:
+        writer.shutdown(wait=True)                                                                                      #a cancelled append may still be running
+        record_pending(cursor, recorder)
+        recorder.close()
+
+
+async def publish_raw(cursor, port=9994, high_water_mark=100, batch_period=0.05):
+    sock = zmq.asyncio.Context.instance().socket(zmq.PUB)
+    sock.setsockopt(zmq.SNDHWM, high_water_mark)
+    sock.bind(f"tcp://*:{port}")
+    while True:
+        await asyncio.sleep(batch_period)
+        timestamps, frames = cursor.read()
+        if len(frames):
+            send_frames(sock, b"Frames", timestamps[-1], np.column_stack((timestamps, frames)))
+
+
+async def run_monitor(args):
+    socket, sockPair = setup_ipc()
+    ring = FrameRingBuffer()
+    reader = AsyncSerialReader(ring, port_regex=args.port, serial_number=cfg.monitor_serial_number.get() or None)
+    path = (args.workdir or cfg.global_workdir.get())+"/monitor"
+    mkdir(path)
+    fname = f"{path}/all-{str(datetime.datetime.now())}"
+    print(fname)
+    recorder_cursor, publisher_cursor = ring.cursor("recorder"), ring.cursor("publisher")
+    consumers = [recorder_cursor, publisher_cursor]
+    limits = limits_from_config()
+    tasks = [reader.run(), handle_commands(sockPair, reader, limits), record(recorder_cursor, ChunkedRecorder(fname, FRAME_COLUMNS))]
+    if raw_port(args) is not None:
+        raw_cursor = ring.cursor("raw")
+        consumers.append(raw_cursor)
+        tasks.append(publish_raw(raw_cursor, port=raw_port(args)))
+    publisher = Publisher(socket, publisher_cursor, reader, consumers,
+                          publish_period=float(cfg.monitor_publish_period.get()), limits=limits)
+    tasks.append(publish(publisher, reader))
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)                       #the tasks unwind and the recording is closed
+    try:
+        await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        pass
+
+
+def main(args=sys.argv[1:]):
+    args = monitor_arguments("Reads the Arduino monitor and publishes its frames, asyncio engine").parse_args(args)
+    hold_pidfile("arduino_monitor")
+    asyncio.run(run_monitor(args))
+
+
+if __name__ == '__main__':
+    main()
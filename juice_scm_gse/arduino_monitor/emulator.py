@@ -0,0 +1,69 @@
+import os, sys, pty, tty, time, argparse
+from threading import Thread
+import numpy as np
+from .parser import FRAME_COLUMNS
+
+
+class ArduinoEmulator(Thread):
+    """Fake Arduino on the master side of a pseudo-terminal.
+
+    Prints the firmware header then frames at the requested rate. The last column
+    (FrameNumber) carries a sequence counter so lost frames can be counted on the other side,
+    and sent_at[sequence] keeps the time each frame was written.
+    """
+
+    def __init__(self, rate=1000., duration=None, tick=0.001, columns=len(FRAME_COLUMNS)):
+        Thread.__init__(self, daemon=True)
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.rate = rate
+        self.duration = duration
+        self.tick = tick
+        self.columns = columns
+        self.sent = 0
+        self.sent_at = np.zeros(int(rate * duration) + 1 if duration else 1 << 20)
+        self.commands = []
+        self._values = np.random.randint(0, 1024, size=(1024, columns - 1))
+
+    def header(self):
+        return f"# Found 3 channels\n{chr(9).join(FRAME_COLUMNS[:self.columns])}\n".encode()
+
+    def frames(self, first, count):
+        values = self._values[np.arange(first, first + count) % len(self._values)]
+        return ''.join('\t'.join(map(str, row)) + f"\t{first + i}\n" for i, row in enumerate(values.tolist())).encode()
+
+    def _read_commands(self):
+        while True:
+            try:
+                self.commands.append(os.read(self.master, 1024))
+            except OSError:
+                return
+
+    def run(self):
+        Thread(target=self._read_commands, daemon=True).start()
+        os.write(self.master, self.header())
+        start = time.time()
+        while self.duration is None or (time.time() - start) < self.duration:
+            due = int((time.time() - start) * self.rate)
+            if due > self.sent:
+                count = due - self.sent
+                data = self.frames(self.sent, count)
+                self.sent_at[np.arange(self.sent, due) % len(self.sent_at)] = time.time()                              #before writing, the monitor may be faster than us
+                os.write(self.master, data)
+                self.sent = due
+            time.sleep(self.tick)
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="Emulates the Arduino monitor firmware on a pseudo-terminal")
+    parser.add_argument("--rate", type=float, default=1000., help="frames per second")
+    args = parser.parse_args(args)
+    emulator = ArduinoEmulator(rate=args.rate)
+    print(f"Emulating the Arduino on {emulator.port}, run Juice_Ardiuno_Monitor --port {emulator.port}")
+    emulator.start()
+    emulator.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import os, time, select, ctypes, ctypes.util
+from glob import glob
+from serial.tools import list_ports
+
+IN_ATTRIB = 0x00000004                                                                                                  #udev fixing the node permissions
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+def find_port(port_regex='/dev/ttyACM[0-1]', serial_number=None):
+    """Returns the device node of the Arduino, matched by USB serial number when given"""
+    if serial_number:
+        for port in list_ports.comports():
+            if port.serial_number == serial_number:
+                return port.device
+        return None
+    ports = sorted(glob(port_regex))
+    if len(ports):
+        return ports[0]
+    return None
+
+
+class DeviceWatcher:
+    """Waits for device nodes to appear in a directory.
+
+    Uses inotify when available so a new node is seen as soon as it is created, otherwise
+    falls back to short polling.
+    """
+
+    def __init__(self, directory='/dev', poll_period=0.05):
+        self.poll_period = poll_period
+        self.fd = None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CREATE | IN_ATTRIB) >= 0:
+                    self.fd = fd
+                else:
+                    os.close(fd)
+        except (OSError, AttributeError):
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def wait(self, timeout):
+        if self.fd is None:
+            time.sleep(min(timeout, self.poll_period))
+            return
+        if select.select([self.fd], [], [], timeout)[0]:
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
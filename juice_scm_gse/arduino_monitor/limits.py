@@ -0,0 +1,83 @@
+import numpy as np
+import juice_scm_gse.config as cfg
+from juice_scm_gse.calibration import Calibration, CHANNELS, load_calibration
+
+
+class LimitEngine:
+    """Per channel min/max thresholds with hysteresis, checked on calibrated frames.
+
+    A channel goes into alarm as soon as one value crosses a threshold and only comes back once it
+    is back inside [low + hysteresis, high - hysteresis]. Alarms are also latched until
+    acknowledge() so short glitches are not missed. NaN thresholds are not checked.
+    """
+
+    def __init__(self, names, low, high, hysteresis):
+        self.names = list(names)
+        self.low = np.nan_to_num(np.asarray(low, dtype=float), nan=-np.inf)
+        self.high = np.nan_to_num(np.asarray(high, dtype=float), nan=np.inf)
+        self.hysteresis = np.asarray(hysteresis, dtype=float)
+        self.active = np.zeros(len(self.names), dtype=bool)
+        self.latched = np.zeros(len(self.names), dtype=bool)
+
+    def check(self, values, timestamps=None):
+        """values is (columns) or (rows x columns), returns the state changes as a list of dicts"""
+        values = np.atleast_2d(values)[:, :len(self.names)]
+        if not len(values):
+            return []
+        above, below = values > self.high, values < self.low
+        if not (above.any() or below.any() or self.active.any()):                                                       #nominal case, no per channel work
+            return []
+        inside = (values[-1] <= self.high - self.hysteresis) & (values[-1] >= self.low + self.hysteresis)
+        tripped = (above | below).any(axis=0)
+        raised = tripped & ~self.active
+        active = (self.active | tripped) & ~inside                                                                      #a glitch inside a batch raises and clears
+        cleared = (self.active | tripped) & ~active
+        events = []
+        if raised.any() or cleared.any():
+            first = (above | below).argmax(axis=0)                                                                     #row where each channel first crossed
+            for channel in np.flatnonzero(raised):
+                events.append(self._event(channel, "high" if above[first[channel], channel] else "low",
+                                          values, first[channel], timestamps))
+            for channel in np.flatnonzero(cleared):
+                events.append(self._event(channel, "cleared", values, len(values) - 1, timestamps))
+        self.active = active
+        self.latched |= tripped
+        return events
+
+    def _event(self, channel, state, values, row, timestamps):
+        return {"channel": self.names[channel], "state": state, "value": float(values[row, channel]),
+                "low": float(self.low[channel]) if np.isfinite(self.low[channel]) else None,
+                "high": float(self.high[channel]) if np.isfinite(self.high[channel]) else None,
+                "timestamp": None if timestamps is None else float(timestamps[row])}
+
+    def acknowledge(self):
+        self.latched = self.active.copy()
+
+    def alarms(self):
+        return [name for name, latched in zip(self.names, self.latched) if latched]
+
+
+def parse_limits(text: str):
+    """'VDD_CHX=3.0:3.6;CONSO_CHX=:11' -> {name: (low, high)}, an empty bound is not checked.
+
+    Bounds are in the calibrated units: volts, and mA for the CONSO channels.
+    """
+    limits = {}
+    for item in filter(None, (item.strip() for item in text.split(';'))):
+        name, _, bounds = item.partition('=')
+        low, _, high = bounds.partition(':')
+        limits[name.strip()] = (float(low) if low.strip() else np.nan, float(high) if high.strip() else np.nan)
+    return limits
+
+
+def limits_from_config(calibration: Calibration = None) -> LimitEngine:
+    """asic_current_limit applies to the three CONSO channels, [Limits] channels adds or overrides"""
+    from juice_scm_gse.utils import Q_
+    calibration = calibration or load_calibration()
+    current_limit = Q_(cfg.asic_current_limit.get()).to("mA").magnitude                                                #calibrated CONSO values are in mA
+    limits = {f"CONSO_CH{ch}": (np.nan, current_limit) for ch in ["X", "Y", "Z"]}
+    limits.update(parse_limits(cfg.limits_channels.get()))
+    low = np.array([limits.get(name, (np.nan, np.nan))[0] for name in CHANNELS])
+    high = np.array([limits.get(name, (np.nan, np.nan))[1] for name in CHANNELS])
+    hysteresis = float(cfg.limits_hysteresis.get()) * np.fmax(np.nan_to_num(np.abs(low)), np.nan_to_num(np.abs(high)))
+    return LimitEngine(CHANNELS, low, high, hysteresis)
@@ -0,0 +1,95 @@
+from collections import namedtuple
+import numpy as np
+
+FRAME_COLUMNS = ["VDD_CHX", "M_CHX", "V_BIAS_LNA_CHX", "S_CHX", "RTN_CHX",
+                 "VDD_CHY", "M_CHY", "V_BIAS_LNA_CHY", "S_CHY", "RTN_CHY",
+                 "VDD_CHZ", "M_CHZ", "V_BIAS_LNA_CHZ", "S_CHZ", "RTN_CHZ",
+                 "ADC00_VDD_CHX", "ADC01_M_CHX", "ADC02_V_BIAS_LNA_CHX", "ADC03_S_CHX", "ADC04_RTN_CHX",
+                 "ADC05_VDD_CHY", "ADC06_M_CHY", "ADC07_V_BIAS_LNA_CHY", "ADC08_S_CHY", "ADC09_RTN_CHY",
+                 "ADC10_VDD_CHZ", "ADC11_M_CHZ", "ADC12_V_BIAS_LNA_CHZ", "ADC13_S_CHZ", "ADC14_RTN_CHZ",
+                 "CONSO_CHX", "CONSO_CHY", "CONSO_CHZ",
+                 "ALIM_CHX", "ALIM_CHY", "ALIM_CHZ",
+                 "FrameNumber"]                                                                                         #same order as the firmware header line
+
+VOLTAGES_COUNT = len(FRAME_COLUMNS) - 1                                                                                 #the last column is not a measurement
+
+ParsedBlock = namedtuple("ParsedBlock", ["frames", "headers"])
+
+
+def is_header(line: bytes) -> bool:
+    return line.startswith(b'#') or b'_CH' in line
+
+
+class FrameParser:
+    """Turns raw bytes from the Arduino serial link into blocks of frames.
+
+    Bytes are accumulated until a full line is available, then every complete line of the
+    chunk is converted at once into a (frames x columns) float array. Incomplete trailing
+    data is kept for the next call.
+    """
+
+    def __init__(self, columns=len(FRAME_COLUMNS)):
+        self.columns = columns
+        self.dropped_lines = 0
+        self._pending = b''
+
+    def reset(self):
+        self._pending = b''
+
+    def feed(self, data: bytes) -> ParsedBlock:
+        data = self._pending + data
+        end = data.rfind(b'\n')
+        if end == -1:
+            self._pending = data
+            return ParsedBlock(np.empty((0, self.columns)), [])
+        self._pending = data[end + 1:]
+        block = data[:end]
+        headers = []
+        if b'#' in block or b'_CH' in block:
+            lines = block.split(b'\n')
+            headers = [line.strip() for line in lines if is_header(line)]
+            block = b'\n'.join(line for line in lines if not is_header(line))
+        return ParsedBlock(self._parse(block), headers)
+
+    def _parse(self, block: bytes):
+        if block and np.all(fields_per_line(block) == self.columns):                                                   #a short line and a long one would compensate in a total count
+            try:
+                return np.array(block.split(), dtype=np.float64).reshape(-1, self.columns)
+            except ValueError:
+                pass
+        return self._parse_line_by_line(block)
+
+    def _parse_line_by_line(self, block: bytes):                                                                        #slow path, only used when the block contains partial or corrupted lines
+        frames = []
+        for line in block.split(b'\n'):
+            fields = line.split()
+            if not fields:
+                continue
+            if len(fields) != self.columns:
+                self.dropped_lines += 1
+                continue
+            try:
+                frames.append(np.array(fields, dtype=np.float64))
+            except ValueError:
+                self.dropped_lines += 1
+        if frames:
+            return np.vstack(frames)
+        return np.empty((0, self.columns))
+
+
+def fields_per_line(block: bytes):
+    """Number of whitespace separated fields of each line of block, without splitting it.
+
+    Control bytes count as blanks, if that disagrees with bytes.split() the reshape fails anyway.
+    """
+    data = np.frombuffer(block, dtype=np.uint8)
+    blank = data <= ord(' ')
+    starts = np.flatnonzero(blank[:-1] & ~blank[1:]) + 1
+    if not blank[0]:
+        starts = np.concatenate(([0], starts))
+    line_ends = np.flatnonzero(data == ord('\n'))
+    return np.diff(np.searchsorted(starts, line_ends), prepend=0, append=len(starts))
+
+
+def read_block(ser, parser: FrameParser) -> ParsedBlock:
+    return parser.feed(ser.read(ser.in_waiting or 1))                                                                   #blocks until at least one byte is there, then takes everything buffered
@@ -0,0 +1,38 @@
+import struct
+import numpy as np
+
+PROTOCOL_VERSION = 1
+
+# version, dtype character, rows, columns, timestamp
+HEADER = struct.Struct("<BcIHd")
+
+_DTYPES = {b'd': np.float64, b'f': np.float32}
+_DTYPE_CHARS = {np.dtype(dtype): char for char, dtype in _DTYPES.items()}
+
+
+def pack_frames(topic: bytes, timestamp: float, frames, dtype=np.float64):
+    """Builds a [topic, header, payload] multipart message, frames is a 1-D or 2-D array.
+
+    The payload is the raw little-endian array buffer so it can be sent without copy.
+    """
+    frames = np.ascontiguousarray(frames, dtype=np.dtype(dtype).newbyteorder('<'))
+    rows, columns = (1, frames.shape[0]) if frames.ndim == 1 else frames.shape
+    header = HEADER.pack(PROTOCOL_VERSION, _DTYPE_CHARS[np.dtype(dtype)], rows, columns, timestamp)
+    return [topic, header, frames]
+
+
+def send_frames(socket, topic: bytes, timestamp: float, frames, dtype=np.float64, flags=0):
+    socket.send_multipart(pack_frames(topic, timestamp, frames, dtype), flags=flags, copy=False)
+
+
+def unpack_frames(parts):
+    """Decodes a multipart message built by pack_frames, accepts bytes or zmq.Frame parts.
+
+    Returns (topic, timestamp, frames) with frames as a (rows x columns) array viewing the payload.
+    """
+    topic, header, payload = (getattr(part, "buffer", part) for part in parts)
+    version, dtype, rows, columns, timestamp = HEADER.unpack(header)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported protocol version {version}")
+    frames = np.frombuffer(payload, dtype=np.dtype(_DTYPES[dtype]).newbyteorder('<')).reshape(rows, columns)
+    return bytes(topic), timestamp, frames
@@ -0,0 +1,143 @@
+import os, sys, time, argparse
+from datetime import datetime
+from glob import glob
+from threading import Thread
+import numpy as np
+import juice_scm_gse.config as cfg
+from juice_scm_gse.utils.recorder import Recording, load_recording
+from . import setup_ipc, CommandHandler, RawPublisher, publish_loop
+from .parser import FrameParser, FRAME_COLUMNS, is_header
+from .ring_buffer import FrameRingBuffer
+from .limits import limits_from_config
+
+
+def load_text_recording(fname, columns=len(FRAME_COLUMNS)) -> Recording:
+    """Loads the legacy all-<datetime>.txt format, one "<datetime>\\t<frame>" line per frame"""
+    stamps, lines, events = [], [], []
+    with open(fname, 'rb') as f:
+        for line in f:
+            line = line.rstrip(b'\r\n')
+            stamp, _, frame = line.partition(b'\t')
+            try:
+                datetime.fromisoformat(stamp.decode())
+            except ValueError:
+                stamp, frame = None, line                                                                               #header and marker lines may not be timestamped
+            if not frame:
+                continue
+            if is_header(frame) or b'ASIC_JUICEMagic3' in frame or len(frame.split()) != columns:
+                events.append({"position": len(lines), "timestamp": stamp, "text": frame.decode(errors='replace')})
+            else:
+                stamps.append(stamp)
+                lines.append(frame)
+    if not lines:
+        return Recording({"columns": FRAME_COLUMNS}, np.empty(0), np.empty((0, columns)), events)
+    frames = np.array(b'\t'.join(lines).split(), dtype=np.float64).reshape(-1, columns)
+    local = np.array([s.decode() for s in stamps], dtype='datetime64[us]').astype(np.int64) / 1e6
+    timestamps = local + (datetime.fromisoformat(stamps[0].decode()).timestamp() - local[0])                            #naive local time to POSIX time
+    for event in events:
+        event["timestamp"] = float(timestamps[min(event["position"], len(timestamps) - 1)])
+    return Recording({"columns": FRAME_COLUMNS}, timestamps, frames, events)
+
+
+def load(path) -> Recording:
+    if os.path.isdir(path):
+        return load_recording(path)
+    return load_text_recording(path)
+
+
+def latest_recording():
+    recordings = glob(cfg.global_workdir.get() + "/monitor/all-*")
+    if not recordings:
+        return None
+    return max(recordings, key=os.path.getmtime)
+
+
+class ReplayReader(Thread):
+    """Stands for SerialReader, pushes a recording into the ring buffer at the requested speed.
+
+    speed is a factor applied to the recorded time, 0 means as fast as possible.
+    """
+
+    def __init__(self, ring: FrameRingBuffer, recording: Recording, speed=1., loop=False, batch_size=1024):
+        Thread.__init__(self, daemon=True)
+        self.ring = ring
+        self.recording = recording
+        self.speed = speed
+        self.loop = loop
+        self.batch_size = batch_size
+        self.parser = FrameParser(ring.columns)                                                                         #only there for its counters
+        self.status = "disconnected"
+        self.reconnections = 0
+        self.replays = 0
+
+    def write(self, message: bytes):
+        pass
+
+    def _events_until(self, events, position):
+        while events and events[0]["position"] <= position:
+            event = events.pop(0)
+            self.ring.mark(event["text"], time.time())
+
+    def replay_once(self):
+        timestamps, frames = self.recording.timestamps, self.recording.frames
+        events = sorted(self.recording.events, key=lambda event: event["position"])
+        position = 0
+        start = time.time()
+        while position < len(frames):
+            if self.speed:
+                recorded_now = timestamps[0] + (time.time() - start) * self.speed
+                end = min(int(np.searchsorted(timestamps, recorded_now, side='right')), position + self.batch_size)
+                if end <= position:
+                    time.sleep(min(.01, (timestamps[position] - recorded_now) / self.speed))
+                    continue
+            else:
+                end = min(position + self.batch_size, len(frames))
+            self._events_until(events, position)
+            self.ring.push(frames[position:end], time.time())
+            position = end
+        self._events_until(events, len(frames))
+
+    def run(self):
+        self.status = "connected"
+        while True:
+            self.replay_once()
+            self.replays += 1
+            if not self.loop:
+                break
+        self.status = "disconnected"
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="Replays a monitor recording on the arduino_monitor ZMQ sockets")
+    parser.add_argument("recording", nargs='?', default=None,
+                        help="all-<datetime>.txt file or recording directory, defaults to the latest one")
+    parser.add_argument("--speed", type=float, default=1., help="replay speed factor, 0 for max speed")
+    parser.add_argument("--loop", action='store_true', help="replay forever")
+    parser.add_argument("--port", type=int, default=9990)
+    parser.add_argument("--port-pair", type=int, default=9991)
+    parser.add_argument("--raw-port", type=int, default=None, help="also publish every frame on this port")
+    args = parser.parse_args(args)
+    path = args.recording or latest_recording()
+    if path is None:
+        print("No recording found")
+        return 1
+    print(f"Replaying {path} at {args.speed or 'max'} speed")
+    recording = load(path)
+    socket, sockPair = setup_ipc(args.port, args.port_pair)
+    ring = FrameRingBuffer(columns=recording.frames.shape[1])
+    reader = ReplayReader(ring, recording, speed=args.speed, loop=args.loop)
+    limits = limits_from_config()
+    commands = CommandHandler(sockPair, reader, limits)
+    publisher_cursor = ring.cursor("publisher")
+    threads = [commands, reader]
+    if args.raw_port is not None:
+        threads.append(RawPublisher(ring.cursor("raw"), port=args.raw_port))
+    for thread in threads:
+        thread.start()
+    consumers = [thread.cursor for thread in threads if hasattr(thread, "cursor")] + [publisher_cursor]
+    publish_loop(socket, publisher_cursor, reader, consumers=consumers,
+                 publish_period=float(cfg.monitor_publish_period.get()), limits=limits)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+from collections import deque
+from itertools import count
+from threading import Condition
+import numpy as np
+from .parser import FRAME_COLUMNS
+
+
+class FrameRingBuffer:
+    """Preallocated single producer / multiple consumers ring buffer of frames.
+
+    Only the serial reader thread writes frames. Each consumer reads through its own RingCursor
+    so a slow consumer never blocks the producer nor the other consumers, it just loses the
+    oldest frames and counts them as overflows. The frame data path takes no lock, the
+    condition is only used to wake up waiting consumers.
+    """
+
+    def __init__(self, capacity=1 << 16, columns=len(FRAME_COLUMNS)):
+        self.capacity = capacity
+        self.columns = columns
+        self.frames = np.zeros((capacity, columns))
+        self.timestamps = np.zeros(capacity)
+        self.written = 0                                                                                                #frames ever pushed, only updated by the producer once data is in place
+        self.writing = 0                                                                                                #seqlock: written + frames being copied, updated before the copy
+        self.events = deque(maxlen=1024)                                                                                #(sequence, frame position, timestamp, text)
+        self._events_sequence = count()
+        self._data_ready = Condition()
+
+    def push(self, frames, timestamp):
+        n = len(frames)
+        if not n:
+            return
+        self.writing = self.written + n                                                                                 #readers compare against it after their copy
+        if n > self.capacity:
+            frames = frames[-self.capacity:]
+            self.written += n - self.capacity
+            n = self.capacity
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self.frames[start:start + first] = frames[:first]
+        self.frames[:n - first] = frames[first:]
+        self.timestamps[start:start + first] = timestamp
+        self.timestamps[:n - first] = timestamp
+        self.written += n
+        with self._data_ready:
+            self._data_ready.notify_all()
+
+    def mark(self, text, timestamp):
+        self.events.append((next(self._events_sequence), self.written, timestamp, text))
+        with self._data_ready:
+            self._data_ready.notify_all()
+
+    def wait(self, position, timeout=None):
+        with self._data_ready:
+            self._data_ready.wait_for(lambda: self.written > position, timeout)
+
+    def cursor(self, name):
+        return RingCursor(self, name)
+
+
+class RingCursor:
+    def __init__(self, ring: FrameRingBuffer, name):
+        self.ring = ring
+        self.name = name
+        self.position = ring.written
+        self.overflows = 0
+        self._next_event = 0
+
+    def wait(self, timeout=None):
+        self.ring.wait(self.position, timeout)
+
+    def read_events(self):
+        events = [event for event in list(self.ring.events) if event[0] >= self._next_event]
+        if events:
+            self._next_event = events[-1][0] + 1
+        return events
+
+    def read(self):
+        ring = self.ring
+        written = ring.written
+        lost = written - self.position - ring.capacity
+        if lost > 0:
+            self.overflows += lost
+            self.position += lost
+        indexes = np.arange(self.position, written) % ring.capacity
+        frames, timestamps = ring.frames[indexes], ring.timestamps[indexes]
+        overwritten = min(ring.writing - ring.capacity - self.position, len(frames))                                  #rows the producer started to overwrite while we were copying
+        if overwritten > 0:
+            self.overflows += overwritten
+            frames, timestamps = frames[overwritten:], timestamps[overwritten:]
+        self.position = written
+        return timestamps, frames
+
+    def read_marked(self):
+        """read() plus the events up to its last frame as (row, timestamp, text), row indexes the returned frames.
+
+        Events older than the first returned frame (lost or before the cursor) get row 0, newer
+        ones are left for the next call.
+        """
+        timestamps, frames = self.read()
+        first = self.position - len(frames)
+        events = []
+        for sequence, position, stamp, text in list(self.ring.events):
+            if sequence < self._next_event:
+                continue
+            if position > self.position:
+                break
+            events.append((max(position - first, 0), stamp, text))
+            self._next_event = sequence + 1
+        return timestamps, frames, events
@@ -0,0 +1,50 @@
+import numpy as np
+
+STATISTICS_ROWS = ["mean", "min", "max", "std", "count"]
+
+
+class WindowStatistics:
+    """Per channel mean, min, max, std and sample count over a publish window.
+
+    Blocks of frames are merged with Chan's parallel variance algorithm so the window never
+    keeps raw frames and stays numerically stable over long windows.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.count = 0
+        self.mean = np.zeros(columns)
+        self.m2 = np.zeros(columns)
+        self.min = np.full(columns, np.inf)
+        self.max = np.full(columns, -np.inf)
+
+    def reset(self):
+        self.count = 0
+        self.mean[:] = 0.
+        self.m2[:] = 0.
+        self.min[:] = np.inf
+        self.max[:] = -np.inf
+
+    def add(self, frames):
+        n = len(frames)
+        if not n:
+            return
+        frames = frames[:, :self.columns]
+        block_mean = frames.mean(axis=0)
+        block_m2 = np.square(frames - block_mean).sum(axis=0)
+        total = self.count + n
+        delta = block_mean - self.mean
+        self.mean += delta * (n / total)
+        self.m2 += block_m2 + np.square(delta) * (self.count * n / total)
+        self.count = total
+        np.minimum(self.min, frames.min(axis=0), out=self.min)
+        np.maximum(self.max, frames.max(axis=0), out=self.max)
+
+    def std(self):
+        if self.count:
+            return np.sqrt(self.m2 / self.count)
+        return np.zeros(self.columns)
+
+    def result(self):
+        """Returns a (len(STATISTICS_ROWS) x columns) array"""
+        return np.vstack([self.mean, self.min, self.max, self.std(), np.full(self.columns, float(self.count))])
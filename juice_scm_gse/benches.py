@@ -0,0 +1,123 @@
+"""Ingestion of several Arduino monitors (benches) over a single ZMQ poller, without Qt.
+
+Benches are listed in the config as "name=endpoint" pairs separated by ';', an endpoint without
+a port uses the monitor default (9990):
+    [Benches]
+    endpoints = bench1=tcp://pc-bench1;bench2=tcp://pc-bench2:9990
+    calibrations = bench1=/home/scm/bench1.json
+"""
+
+import time
+from collections import OrderedDict
+from datetime import datetime
+import zmq
+import juice_scm_gse.config as cfg
+from juice_scm_gse.arduino_monitor.protocol import unpack_frames
+from juice_scm_gse.calibration import load_calibration
+from juice_scm_gse.utils import mkdir
+from juice_scm_gse.utils.recorder import BackgroundRecorder
+
+
+def parse_pairs(text: str) -> OrderedDict:
+    pairs = OrderedDict()
+    for item in filter(None, (item.strip() for item in text.split(';'))):
+        name, _, value = item.partition('=')
+        pairs[name.strip()] = value.strip()
+    return pairs
+
+
+def bench_endpoints(text=None) -> OrderedDict:
+    endpoints = parse_pairs(cfg.bench_endpoints.get() if text is None else text)
+    for name, endpoint in endpoints.items():
+        if endpoint.count(':') < 2:                                                                                     #tcp://host without port
+            endpoints[name] = f"{endpoint}:9990"
+    return endpoints
+
+
+class BenchState:
+    """Latest calibrated values, monitor status and recording of one bench"""
+
+    def __init__(self, name, endpoint, calibration):
+        self.name = name
+        self.endpoint = endpoint
+        self.calibration = calibration
+        self.status = "Unknown"
+        self.values = None                                                                                              #calibrated, in calibration.names order
+        self.timestamp = None
+        self.received = 0
+        self.recorder = None
+
+    @property
+    def age(self):
+        return None if self.timestamp is None else time.time() - self.timestamp
+
+    def value(self, name):
+        return None if self.values is None else self.values[self.calibration.names.index(name)]
+
+    def start_recording(self, path, metadata=None):
+        self.stop_recording()
+        metadata = {"bench": self.name, "endpoint": self.endpoint, **self.calibration.metadata(), **(metadata or {})}
+        self.recorder = BackgroundRecorder(path, self.calibration.names, metadata=metadata)
+        self.recorder.start()
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder.join()
+            self.recorder = None
+
+
+class BenchMultiplexer:
+    """One SUB socket per bench, all served by the same zmq.Poller.
+
+    poll() drains every socket that is ready and only keeps the newest values of each bench, so the
+    cost of displaying them does not grow with the message rate.
+    """
+
+    def __init__(self, endpoints=None, calibrations=None, context=None):
+        self.context = context or zmq.Context.instance()
+        self.poller = zmq.Poller()
+        self.benches = OrderedDict()
+        self._sockets = {}
+        calibrations = parse_pairs(cfg.bench_calibrations.get()) if calibrations is None else calibrations
+        for name, endpoint in (bench_endpoints() if endpoints is None else endpoints).items():
+            sock = self.context.socket(zmq.SUB)
+            sock.connect(endpoint)
+            sock.setsockopt(zmq.SUBSCRIBE, b"Voltages")
+            sock.setsockopt(zmq.SUBSCRIBE, b"Status")
+            self.poller.register(sock, zmq.POLLIN)
+            self._sockets[sock] = self.benches[name] = BenchState(name, endpoint,
+                                                                  load_calibration(calibrations.get(name) or None))
+
+    def poll(self, timeout=100):
+        """Handles everything received within timeout (ms), returns the names of the updated benches"""
+        updated = set()
+        for sock, _ in self.poller.poll(timeout):
+            bench = self._sockets[sock]
+            while sock.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                self._handle(bench, sock.recv_multipart(copy=False))
+            updated.add(bench.name)
+        return updated
+
+    @staticmethod
+    def _handle(bench, parts):
+        if len(parts) == 1:
+            _, bench.status = parts[0].bytes.decode().split(' ', 1)
+            return
+        _, timestamp, frames = unpack_frames(parts)
+        bench.values = bench.calibration.convert(frames[0])
+        bench.timestamp = timestamp
+        bench.received += 1
+        if bench.recorder is not None:
+            bench.recorder.append(timestamp, bench.values)
+
+    def record_all(self, directory=None):
+        directory = directory or cfg.global_workdir.get() + "/benches"
+        for bench in self.benches.values():
+            mkdir(f"{directory}/{bench.name}")
+            bench.start_recording(f"{directory}/{bench.name}/all-{str(datetime.now())}")
+
+    def close(self):
+        for sock, bench in self._sockets.items():
+            bench.stop_recording()
+            sock.close(linger=0)
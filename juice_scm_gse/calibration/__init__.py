@@ -0,0 +1,73 @@
+import json
+from collections import OrderedDict
+import numpy as np
+import juice_scm_gse.config as cfg
+
+CHANNELS = ["VDD_CHX", "M_CHX", "V_BIAS_LNA_CHX", "S_CHX", "RTN_CHX",
+            "VDD_CHY", "M_CHY", "V_BIAS_LNA_CHY", "S_CHY", "RTN_CHY",
+            "VDD_CHZ", "M_CHZ", "V_BIAS_LNA_CHZ", "S_CHZ", "RTN_CHZ",
+            "ADC_VDD_CHX", "ADC_M_CHX", "ADC_V_BIAS_LNA_CHX", "ADC_S_CHX", "ADC_RTN_CHX",
+            "ADC_VDD_CHY", "ADC_M_CHY", "ADC_V_BIAS_LNA_CHY", "ADC_S_CHY", "ADC_RTN_CHY",
+            "ADC_VDD_CHZ", "ADC_M_CHZ", "ADC_V_BIAS_LNA_CHZ", "ADC_S_CHZ", "ADC_RTN_CHZ",
+            "CONSO_CHX", "CONSO_CHY", "CONSO_CHZ",
+            "ALIM_CHX", "ALIM_CHY", "ALIM_CHZ"]                                                                       #same order as the Voltages frames
+
+DERIVED = [(name, a, b) for ch in ["X", "Y", "Z"] for name, a, b in [                                                   #name = a - b, computed after calibration
+    (f"Offset_S_CH{ch}", f"S_CH{ch}", f"M_CH{ch}"),
+    (f"Offset_RTN_CH{ch}", f"RTN_CH{ch}", f"M_CH{ch}"),
+    (f"ADC_Offset_S_CH{ch}", f"ADC_S_CH{ch}", f"ADC_M_CH{ch}"),
+    (f"ADC_Offset_RTN_CH{ch}", f"ADC_RTN_CH{ch}", f"ADC_M_CH{ch}")]]
+
+DEFAULT_VERSION = "default-1"
+
+
+def default_gain(channel):
+    if "VDD" in channel:
+        return (6.0 + 0.023) / (4096. if "ADC" in channel else 1024.)
+    if "CONSO" in channel or "ALIM" in channel:
+        return 1. / 1000.
+    return 5. / (4096. if "ADC" in channel else 1024.)
+
+
+class Calibration:
+    """Per channel gain and offset, converts raw counts with one multiply-add.
+
+    A calibration file is a JSON document:
+        {"version": "bench1-2020-01", "bench": "bench1",
+         "channels": {"VDD_CHX": {"gain": 0.00588, "offset": 0.0}, ...}}
+    Channels missing from the file keep the default factors.
+    """
+
+    def __init__(self, version=DEFAULT_VERSION, bench="", channels=None):
+        self.version = version
+        self.bench = bench
+        channels = channels or {}
+        self.gain = np.array([channels.get(name, {}).get("gain", default_gain(name)) for name in CHANNELS])
+        self.offset = np.array([channels.get(name, {}).get("offset", 0.) for name in CHANNELS])
+        self.names = CHANNELS + [name for name, _, _ in DERIVED]
+        self._derived_a = np.array([CHANNELS.index(a) for _, a, _ in DERIVED])
+        self._derived_b = np.array([CHANNELS.index(b) for _, _, b in DERIVED])
+
+    def apply(self, frames):
+        """frames is a (columns) or (rows x columns) array of raw counts, extra columns are ignored"""
+        return frames[..., :len(CHANNELS)] * self.gain + self.offset
+
+    def convert(self, frames):
+        """Calibrated values followed by the derived ones, in self.names order"""
+        values = self.apply(frames)
+        return np.concatenate((values, values[..., self._derived_a] - values[..., self._derived_b]), axis=-1)
+
+    def as_dict(self, frame):
+        return OrderedDict(zip(self.names, self.convert(frame).tolist()))
+
+    def metadata(self):
+        return {"calibration_version": self.version, "calibration_bench": self.bench}
+
+
+def load_calibration(fname=None) -> Calibration:
+    fname = fname or cfg.calibration_file.get()
+    if not fname:
+        return Calibration()
+    with open(fname) as f:
+        table = json.load(f)
+    return Calibration(version=table["version"], bench=table.get("bench", ""), channels=table.get("channels", {}))
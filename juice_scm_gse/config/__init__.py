@@ -36,16 +36,44 @@ def log_dir():
     return global_workdir.get()+"/logs"
 
 
+def run_dir():
+    return global_workdir.get()+"/run"
+
+
 mail_server = ConfigEntry("mail", "server", "localhost")
 mail_login = ConfigEntry("mail", "login")
 mail_password = ConfigEntry("mail", "password")
 mail_recipients = ConfigEntry("mail", "recipients")
 
+monitor_publish_period = ConfigEntry("Monitor", "publish_period", "0.33")
+monitor_raw_frames = ConfigEntry("Monitor", "raw_frames", "False")
+monitor_raw_port = ConfigEntry("Monitor", "raw_port", "9994")
+monitor_serial_number = ConfigEntry("Monitor", "serial_number")                                                         #USB serial number of the Arduino, empty to use the first /dev/ttyACM*
+
+supervise_discovery = ConfigEntry("Supervisor", "discovery", "False")                                                    #also start and watch the Discovery driver from the GUI
+
+gui_display_rate = ConfigEntry("GUI", "display_rate", "10")                                                             #maximum LCD refresh rate in Hz
+gui_chart_span = ConfigEntry("GUI", "chart_span", "3600")                                                               #seconds of history shown by the charts
+
+bench_endpoints = ConfigEntry("Benches", "endpoints")                                                                   #name=tcp://host[:port] pairs separated by ';', empty for a single local bench
+bench_calibrations = ConfigEntry("Benches", "calibrations")                                                             #name=calibration file pairs separated by ';'
+bench_record = ConfigEntry("Benches", "record", "True")                                                                 #record every bench under <workdir>/benches/<name>
+
+calibration_file = ConfigEntry("Calibration", "file")                                                                  #JSON gain/offset table of the bench, empty for default factors
+
 asic_chx_disco = ConfigEntry("ASIC", "chx_disco")
 asic_chy_disco = ConfigEntry("ASIC", "chy_disco")
 asic_chz_disco = ConfigEntry("ASIC", "chz_disco")
 asic_current_limit = ConfigEntry("ASIC", "current_limit","11mA")
 
+limits_channels = ConfigEntry("Limits", "channels")                                                                     #calibrated thresholds (V, mA for CONSO) as NAME=low:high pairs separated by ';', either bound may be empty
+limits_hysteresis = ConfigEntry("Limits", "hysteresis", "0.05")                                                         #fraction of the threshold a value must come back by to clear an alarm
+
+settle_tolerance = ConfigEntry("Settling", "tolerance", "0.001")                                                        #volts between two successive short acquisitions
+settle_relative_tolerance = ConfigEntry("Settling", "relative_tolerance", "0.01")                                       #fraction of the measured amplitude, for sine excitations
+settle_interval = ConfigEntry("Settling", "interval", "0.05")                                                           #minimum seconds between two compared acquisitions
+settle_timeout = ConfigEntry("Settling", "timeout", "10")                                                               #seconds, the measurement goes on unsettled after it
+
 psd_snapshots_count = ConfigEntry("PSD", "snapshots_count", "10")
 psd_sampling_freq = ConfigEntry("PSD", "sampling_freq", "100000.")
 
@@ -1,19 +1,23 @@
 import json
 from typing import List, Dict
 from lppinstru.discovery import Discovery, c_int, trigsrcAnalogOut1
+import lppinstru.discovery as dwf_discovery
+from ctypes import c_ubyte, c_double, POINTER
 import time, datetime
 import zmq, math
 import sys, traceback
 import functools
 import numpy as np
 import pandas as pds
-import peakutils
 import signal,atexit
 from threading import Thread
-from juice_scm_gse.analysis import noise,fft
+from queue import Queue
+from juice_scm_gse.analysis import noise,multisine
+from juice_scm_gse.analysis.tf import demodulate
 from juice_scm_gse import config as cfg
 from juice_scm_gse.utils import mkdir
-from juice_scm_gse.utils import Q_,ureg
+from juice_scm_gse.utils.recorder import SnapshotWriter
+from juice_scm_gse.utils.supervisor import hold_pidfile
 import logging as log
 
 commands = {}
@@ -25,7 +29,7 @@ class DiscoCommand:
         self.func = func
         commands[func.__name__] = func          #Creat a dictionnary of the commands with their names as keys
 
-    def make_cmd(self, channel, **kwargs):
+    def make_cmd(self, channel, **kwargs):                                                                              #channel is a name ("CHX") or a list of names
         payload = {
             "CMD": self.func.__name__,
             "channel": channel,
@@ -49,66 +53,130 @@ class Disco_Driver(Discovery):
     def turn_off(self):
         self.digital_io = 0
 
-
-def set_dc_output(disco: Disco_Driver, dc_value):
+    def custom_waveform_available(self):
+        dwf = getattr(dwf_discovery, "dwf", None)
+        return dwf is not None and hasattr(dwf, "FDwfAnalogOutNodeDataSet") and hasattr(self, "hdwf")
+
+    def analog_out_custom(self, data, frequency, amplitude=1., offset=0., channel=0):
+        """Plays `data` (normalized to +/-1) once per period of `frequency` on the AWG, through the DWF custom node"""
+        if not self.custom_waveform_available():
+            raise RuntimeError("the DWF library does not expose the AWG custom waveform node")
+        dwf, node, ch = dwf_discovery.dwf, c_int(0), c_int(channel)                                                    #node 0 is the carrier
+        data = np.ascontiguousarray(data, dtype=np.float64)
+        dwf.FDwfAnalogOutNodeEnableSet(self.hdwf, ch, node, c_int(1))
+        dwf.FDwfAnalogOutNodeFunctionSet(self.hdwf, ch, node, c_ubyte(30))                                              #funcCustom
+        dwf.FDwfAnalogOutNodeDataSet(self.hdwf, ch, node, data.ctypes.data_as(POINTER(c_double)), c_int(len(data)))
+        dwf.FDwfAnalogOutNodeFrequencySet(self.hdwf, ch, node, c_double(frequency))
+        dwf.FDwfAnalogOutNodeAmplitudeSet(self.hdwf, ch, node, c_double(amplitude))
+        dwf.FDwfAnalogOutNodeOffsetSet(self.hdwf, ch, node, c_double(offset))
+        dwf.FDwfAnalogOutConfigure(self.hdwf, ch, c_int(1))
+
+
+def read_levels(disco: Disco_Driver, ch1=True, ch2=True, samples=512):
+    res = disco.analog_in_read(ch1=ch1, ch2=ch2, frequency=disco.max_sampling_buffer * 4, samplesCount=samples,
+                               ch1range=10.)
+    return np.array([np.mean(wf) for wf in res[0]])
+
+
+def read_amplitudes(disco: Disco_Driver, frequency, periods=4, samples=512):
+    res = disco.analog_in_read(ch1=True, ch2=True, frequency=min(frequency * samples / periods, disco.max_sampling_freq),
+                               samplesCount=samples, ch1range=10.)
+    return np.array([np.std(wf) for wf in res[0]])
+
+
+def wait_settled(read, step, settling: list, tolerance=None, relative_tolerance=None, timeout=None, interval=None,
+                 consecutive=2):
+    """Repeats read() (a short acquisition reduced to a few values), at least interval seconds apart,
+    until `consecutive` successive results agree within tolerance + relative_tolerance * |value|
+    or until timeout seconds.
+
+    The time it took is appended to settling (results metadata) and returned.
+    """
+    tolerance = float(cfg.settle_tolerance.get()) if tolerance is None else tolerance
+    relative_tolerance = float(cfg.settle_relative_tolerance.get()) if relative_tolerance is None else relative_tolerance
+    timeout = float(cfg.settle_timeout.get()) if timeout is None else timeout
+    interval = float(cfg.settle_interval.get()) if interval is None else interval
+    start = last_read = time.time()
+    previous, stable, settled = read(), 1, False
+    while not settled and time.time() - start < timeout:
+        time.sleep(max(0., interval - (time.time() - last_read)))                                                       #a slow drift must show up as a difference
+        last_read = time.time()
+        value = read()
+        stable = stable + 1 if np.all(np.abs(value - previous) <= tolerance + relative_tolerance * np.abs(value)) else 1
+        settled = stable >= consecutive
+        previous = value
+    duration = time.time() - start
+    if not settled:
+        log.warning(f"{step} not settled after {duration:.1f}s")
+    settling.append({"step": step, "settle_time": duration, "settled": settled})
+    return duration
+
+
+def save_settling(output_dir, settling: list):
+    with open(output_dir + "/settling.json", 'w') as out:
+        json.dump(settling, out, indent=4)
+
+
+def set_dc_output(disco: Disco_Driver, dc_value, settling: list = None):
     disco.analog_out_gen(shape='DC', channel=0, offset=dc_value)
-    time.sleep(.2)
+    wait_settled(lambda: read_levels(disco, ch1=False), f"DC {dc_value:.4f}V", [] if settling is None else settling,
+                 relative_tolerance=0.)
     res = disco.analog_in_read(ch1=False, ch2=True, frequency=disco.max_sampling_buffer * 4,
                                samplesCount=disco.max_sampling_buffer, ch1range=10.)
     return np.median(res[0][0])
 
 
-def remove_offset(disco: Disco_Driver):
+def remove_offset(disco: Disco_Driver, settling: list = None):
     v_min, v_max = 2.35, 2.65
-    offset1 = set_dc_output(disco,v_min)
-    offset2 = set_dc_output(disco,v_max)
+    offset1 = set_dc_output(disco,v_min, settling)
+    offset2 = set_dc_output(disco,v_max, settling)
     a = (offset2-offset1)/(v_max-v_min)
     b = offset2 - (a*v_max)
     command = max(min(-b/a,5.),-5.)
-    offset = set_dc_output(disco, command)
+    offset = set_dc_output(disco, command, settling)
     log.info(f"Minimized offset to {offset}V with {command}V")
     return command
 
 
 @DiscoCommand
-def do_psd(disco: Disco_Driver,progress_func, psd_output_dir, psd_snapshots_count=10, psd_sampling_freq=[100000], **kwargs):
+def do_psd(disco: Disco_Driver,progress_func, psd_output_dir, psd_snapshots_count=10, psd_sampling_freq=[100000], settling=None, **kwargs):
     mkdir(psd_output_dir)
-    snapshot_asic_out = []
-    sampling_freq_chx = int()
-    remove_offset(disco)
+    settling = [] if settling is None else settling
+    remove_offset(disco, settling)
+    save_settling(psd_output_dir, settling)
     progress_func("psd",0.,"", 0.)
-    for f in psd_sampling_freq:
-        for step in range(psd_snapshots_count):
-            progress_func("psd",0.,f"Current snapshot {step}/{psd_snapshots_count}",float(step)/float(psd_snapshots_count))
-            res = disco.analog_in_read(ch1=False, ch2=True, frequency=f,
-                                       samplesCount=disco.max_sampling_buffer)
-            sampling_freq_chx = res[1]
-            snapshot_asic_out.append(res[0][0])
-
-        progress_func("psd analysis", 0.,"", 0.)
-        for i in range(len(snapshot_asic_out)):
-            progress_func("psd analysis", 0., f"Saving snapshot {i}/{len(snapshot_asic_out)}", float(i)/float(len(snapshot_asic_out)))
-            np.savetxt(psd_output_dir + f"/snapshot_psd_{f}Hz_{i}_asic_out.csv.gz", snapshot_asic_out[i])
-        freq_ch1, psd = noise.psd(snapshot_asic_out, sampling_freq_chx, window=True, removeMean=True)
-        progress_func("psd analysis", 0.,"", 1.)
-        df = pds.DataFrame(data={"PSD_ASIC_OUTPUT": psd}, index=freq_ch1)
-        df.to_csv(psd_output_dir + f"/psd_{f}Hz.csv.gz")
-
-
-@DiscoCommand
-def do_dynamic_tf(disco: Disco_Driver,progress_func, d_tf_output_dir, d_tf_frequencies=np.logspace(0,6,num=200), **kwargs):
-    mkdir(d_tf_output_dir)
+    writer = SnapshotWriter()                                                                                           #snapshot N is written while N+1 is acquired
+    writer.start()
+    try:
+        for f in psd_sampling_freq:
+            accumulator = None
+            for step in range(psd_snapshots_count):
+                progress_func("psd",0.,f"Current snapshot {step}/{psd_snapshots_count}",float(step)/float(psd_snapshots_count))
+                res = disco.analog_in_read(ch1=False, ch2=True, frequency=f,
+                                           samplesCount=disco.max_sampling_buffer)
+                snapshot = np.asarray(res[0][0])
+                writer.put(psd_output_dir + f"/snapshot_psd_{f}Hz_{step}_asic_out.npy", snapshot)
+                accumulator = accumulator or noise.PsdAccumulator(res[1], removeMean=True)
+                accumulator.add(snapshot)
+            freq_ch1, psd = accumulator.result()
+            progress_func("psd analysis", 0.,"", 1.)
+            df = pds.DataFrame(data={"PSD_ASIC_OUTPUT": psd}, index=freq_ch1)
+            df.to_csv(psd_output_dir + f"/psd_{f}Hz.csv.gz")
+    finally:
+        writer.close()
+
+
+def stepped_sine_tf(disco: Disco_Driver, progress_func, d_tf_output_dir, d_tf_frequencies, dc, settling: list):
     tf_g = []
     tf_phi = []
     tf_f = []
     progress_func("TF",0.,"", 0.)
     i = 0.
-    dc = remove_offset(disco)
     for f in d_tf_frequencies:
         progress_func("TF", 0., f"Current frequency {f:.1f}Hz", i/len(d_tf_frequencies))
         i+=1.
         disco.analog_out_gen(frequency=f, shape='Sine', channel=0, amplitude=.2,offset=dc)
-        time.sleep(.3)
+        wait_settled(lambda: read_amplitudes(disco, f), f"Sine {f:.1f}Hz", settling)
         res = disco.analog_in_read(ch1=True, ch2=True, frequency=min(f*disco.max_sampling_buffer/10.,disco.max_sampling_freq), samplesCount=disco.max_sampling_buffer, ch1range=10.)
         real_fs = res[1]
         data = pds.DataFrame(data={"input": res[0][0],
@@ -116,29 +184,107 @@ def do_dynamic_tf(disco: Disco_Driver,progress_func, d_tf_output_dir, d_tf_frequ
                                                                          1. / real_fs))
         data.to_csv(d_tf_output_dir + f"/dynamic_tf_snapshot_{f}Hz.csv.gz")
 
-        window = np.hanning(len(res[0][0]))
-        in_spect = fft.fft(waveform=res[0][0], sampling_frequency=real_fs, window=window, remove_mean=True)
-        out_spect = fft.fft(waveform=res[0][1], sampling_frequency=real_fs, window=window, remove_mean=True)
-        freq = in_spect["f"]
-        peaks = peakutils.indexes(in_spect["mod"], min_dist=2)
-        for peak in peaks:
-            f = in_spect["f"][peak]
-            g = 20. * np.log10(out_spect["mod"][peak] / in_spect["mod"][peak])
-            tf_phi.append(out_spect["phi"][peak] - in_spect["phi"][peak])
-            tf_g.append(g)
-            tf_f.append(f)
+        spect = demodulate(np.array(res[0][:2]), real_fs, f, window=True)                                               #input and output at the injected frequency only
+        tf_phi.append(spect["phi"][1] - spect["phi"][0])
+        tf_g.append(20. * np.log10(spect["mod"][1] / spect["mod"][0]))
+        tf_f.append(spect["f"])
 
     progress_func("TF done!", 0., "", 1.)
     tf = pds.DataFrame(data={"G(dB)":tf_g,"Phi(rad)":tf_phi},index=tf_f)
     tf.to_csv(d_tf_output_dir + f"/dynamic_tf.csv.gz")
+    return tf_f, tf_g, tf_phi
+
+
+def broadband_tf(disco: Disco_Driver, progress_func, d_tf_output_dir, d_tf_frequencies, dc, settling: list,
+                 mode="multisine", amplitude=.2, awg_samples=4096, periods=2):
+    """Excites a whole band at once with a multisine or a log chirp played as the AWG custom waveform"""
+    frequencies = np.asarray(d_tf_frequencies)
+    points_per_decade = len(frequencies) / np.log10(frequencies.max() / frequencies.min())
+    bands = multisine.plan_bands(frequencies.min(), frequencies.max(), points_per_decade)
+    samples = disco.max_sampling_buffer
+    tf_f, tf_g, tf_phi = [], [], []
+    writer = SnapshotWriter()
+    writer.start()
+    progress_func(f"TF {mode}", 0., "", 0.)
+    try:
+        for i, (f0, harmonics) in enumerate(bands):
+            f0 = multisine.aligned_base_frequency(f0, samples, periods, disco.max_sampling_freq)
+            progress_func(f"TF {mode}", 0., f"Band {harmonics[0] * f0:.1f}Hz-{harmonics[-1] * f0:.1f}Hz",
+                          i / len(bands))
+            if mode == "chirp":
+                waveform = multisine.log_chirp(awg_samples, harmonics[0], harmonics[-1])
+            else:
+                waveform = multisine.multisine(awg_samples, harmonics)
+            disco.analog_out_custom(waveform, frequency=f0, amplitude=amplitude, offset=dc, channel=0)
+            wait_settled(lambda: read_amplitudes(disco, f0, periods=1), f"{mode} {f0:.4g}Hz", settling)               #RMS over one whole period
+            res = disco.analog_in_read(ch1=True, ch2=True, frequency=f0 * samples / periods, samplesCount=samples,
+                                       ch1range=10.)
+            real_fs = res[1]
+            writer.put(d_tf_output_dir + f"/dynamic_tf_{mode}_snapshot_{f0:.6g}Hz.npy", np.array(res[0][:2]))
+            g, phi = multisine.tf_at_bins(np.asarray(res[0][0]), np.asarray(res[0][1]), harmonics,
+                                          periods=samples * f0 / real_fs)
+            tf_f.extend(harmonics * f0)
+            tf_g.extend(g)
+            tf_phi.extend(phi)
+    finally:
+        writer.close()
+    progress_func(f"TF {mode} done!", 0., "", 1.)
+    tf = pds.DataFrame(data={"G(dB)": tf_g, "Phi(rad)": tf_phi}, index=tf_f)
+    tf.to_csv(d_tf_output_dir + f"/dynamic_tf_{mode}.csv.gz")
+    return tf_f, tf_g, tf_phi
+
+
+def compare_tf_report(d_tf_output_dir, reference, reference_duration, fast, fast_duration, mode="multisine"):
+    f, g_diff, phi_diff = multisine.compare_tf(*reference, *fast)
+    pds.DataFrame(data={"G_diff(dB)": g_diff, "Phi_diff(rad)": phi_diff}, index=f).to_csv(
+        d_tf_output_dir + f"/dynamic_tf_comparison.csv.gz")
+    report = {
+        "mode": mode, "points": len(f),
+        "sine_duration": reference_duration, f"{mode}_duration": fast_duration,
+        "speedup": reference_duration / fast_duration if fast_duration else None,
+        "gain_diff_max_db": float(np.max(np.abs(g_diff))) if len(f) else None,
+        "gain_diff_rms_db": float(np.sqrt(np.mean(g_diff ** 2))) if len(f) else None,
+        "phase_diff_max_rad": float(np.max(np.abs(phi_diff))) if len(f) else None,
+        "phase_diff_rms_rad": float(np.sqrt(np.mean(phi_diff ** 2))) if len(f) else None
+    }
+    with open(d_tf_output_dir + "/dynamic_tf_comparison.json", 'w') as out:
+        json.dump(report, out, indent=4)
+    log.info(f"Dynamic TF comparison: {report}")
+    return report
+
+
+@DiscoCommand
+def do_dynamic_tf(disco: Disco_Driver,progress_func, d_tf_output_dir, d_tf_frequencies=np.logspace(0,6,num=200), d_tf_mode="sine", settling=None, **kwargs):
+    """d_tf_mode: "sine" steps through d_tf_frequencies, "multisine" and "chirp" excite whole bands at once,
+    "compare" measures with both sine and multisine and writes dynamic_tf_comparison.csv.gz/.json"""
+    if d_tf_mode not in ("sine", "multisine", "chirp", "compare"):
+        raise ValueError(f"unknown dynamic TF mode {d_tf_mode}")
+    if d_tf_mode != "sine" and not disco.custom_waveform_available():                                                   #fail before the long stepped sweep
+        raise RuntimeError(f"dynamic TF mode {d_tf_mode} needs the AWG custom waveform, not available with this DWF library")
+    mkdir(d_tf_output_dir)
+    settling = [] if settling is None else settling
+    dc = remove_offset(disco, settling)
+    if d_tf_mode in ("sine", "compare"):
+        start = time.time()
+        reference = stepped_sine_tf(disco, progress_func, d_tf_output_dir, d_tf_frequencies, dc, settling)
+        reference_duration = time.time() - start
+    if d_tf_mode in ("multisine", "chirp", "compare"):
+        mode = "multisine" if d_tf_mode == "compare" else d_tf_mode
+        start = time.time()
+        fast = broadband_tf(disco, progress_func, d_tf_output_dir, d_tf_frequencies, dc, settling, mode=mode)
+        if d_tf_mode == "compare":
+            compare_tf_report(d_tf_output_dir, reference, reference_duration, fast, time.time() - start, mode)
+    save_settling(d_tf_output_dir, settling)
     disco.analog_out_disable(channel=0)
 
 
 @DiscoCommand
-def do_static_tf(disco: Disco_Driver,progress_func, s_tf_output_dir,s_tf_amplitude=.5,s_tf_steps=100, **kwargs):
+def do_static_tf(disco: Disco_Driver,progress_func, s_tf_output_dir,s_tf_amplitude=.5,s_tf_steps=100, settling=None, **kwargs):
     mkdir(s_tf_output_dir)
+    settling = [] if settling is None else settling
     tf_vin = []
     tf_vout = []
+    tf_settle = []
     v_min = 2.5-s_tf_amplitude
     v_max = 2.5+s_tf_amplitude
     progress_func("Static TF",0., "", 0.)
@@ -148,7 +294,7 @@ def do_static_tf(disco: Disco_Driver,progress_func, s_tf_output_dir,s_tf_amplitu
         progress_func("Static TF", 0., f"Current voltage = {step:.3f}V", i/len(input_range))
         i+=1.
         disco.analog_out_gen(shape='DC', channel=0,offset=step)
-        time.sleep(.3)
+        tf_settle.append(wait_settled(lambda: read_levels(disco), f"DC {step:.4f}V", settling, relative_tolerance=0.))
         res = disco.analog_in_read(ch1=True, ch2=True, frequency=disco.max_sampling_buffer*4, samplesCount=disco.max_sampling_buffer, ch1range=10.)
         real_fs = res[1]
         data = pds.DataFrame(data={"input": res[0][0],
@@ -160,8 +306,9 @@ def do_static_tf(disco: Disco_Driver,progress_func, s_tf_output_dir,s_tf_amplitu
         tf_vout.append(np.mean(res[0][1]))
 
     progress_func("Static TF done!", 0., "",1.)
-    tf = pds.DataFrame(data={"Vout": tf_vout}, index=tf_vin)
+    tf = pds.DataFrame(data={"Vout": tf_vout, "Settle(s)": tf_settle}, index=tf_vin)
     tf.to_csv(s_tf_output_dir + f"/static_tf.csv.gz")
+    save_settling(s_tf_output_dir, settling)
     disco.analog_out_disable(channel=0)
 
 
@@ -181,13 +328,14 @@ def do_measurements(disco, progress_func, **kwargs):
     for measurement in [do_psd, do_dynamic_tf, do_static_tf]:
         log.info("turn ON PSU")
         turn_on_psu(disco)
-        time.sleep(2.)
+        settling = []                                                                                                   #saved with the measurement results
+        wait_settled(lambda: read_levels(disco, ch1=False), "PSU on", settling, relative_tolerance=0.)
         log.info("start " + measurement.__name__)
         progress_func('', global_progress,"", 0.)
-        measurement(disco,progress_func=lambda step,_,step_detail,step_progress: progress_func(step=step, global_progress=global_progress,step_detail=step_detail, step_progress=step_progress), **kwargs)
+        measurement(disco,progress_func=lambda step,_,step_detail,step_progress: progress_func(step=step, global_progress=global_progress,step_detail=step_detail, step_progress=step_progress), settling=settling, **kwargs)
         log.info("turn OFF PSU")
         turn_off_psu(disco)
-        time.sleep(2.)
+        wait_settled(lambda: read_levels(disco, ch1=False), "PSU off", [], relative_tolerance=0.)
         global_progress+=1./3.
     progress_func('Done!', 1,'', 1.)
 
@@ -221,9 +369,10 @@ def parse_cmd(cmd, discos, progress_func):
     return json.dumps(cmd)
 
 
-def udpate_progress(progress_sock:zmq.Socket, step:str, global_progress:float,step_detail:str, step_progress:float):
+def udpate_progress(progress_sock:zmq.Socket, step:str, global_progress:float,step_detail:str, step_progress:float, channel=None):
     progress_sock.send_json(json.dumps(
         {
+            "channel":channel,
             "step":step,
             "global_progress":global_progress,
             "step_detail":step_detail,
@@ -232,11 +381,59 @@ def udpate_progress(progress_sock:zmq.Socket, step:str, global_progress:float,st
     ))
 
 
+class DeviceWorker(Thread):
+    """Executes the commands of one Discovery in order, workers of different channels run concurrently.
+
+    Each worker owns its result and progress sockets, a reply is sent for every channel a command
+    targets, as soon as that channel is done.
+    """
+
+    def __init__(self, channel, disco: Disco_Driver, push_port=9992, progress_port=9993):
+        Thread.__init__(self, daemon=True)
+        self.channel = channel
+        self.disco = disco
+        self.push_port = push_port
+        self.progress_port = progress_port
+        self.queue = Queue()
+
+    def submit(self, cmd):
+        self.queue.put(cmd)
+
+    def run(self):
+        context = zmq.Context.instance()
+        push_sock = context.socket(zmq.PUSH)
+        push_sock.connect(f"tcp://localhost:{self.push_port}")
+        progress_sock = context.socket(zmq.PUSH)
+        progress_sock.connect(f"tcp://localhost:{self.progress_port}")
+        progress = lambda step, global_progress, step_detail, step_progress: udpate_progress(
+            progress_sock, step, global_progress, step_detail, step_progress, channel=self.channel)
+        while True:
+            cmd = self.queue.get()
+            push_sock.send_json(parse_cmd(cmd, {self.channel: self.disco}, progress))
+
+
+def dispatch(cmd, workers: Dict[str, DeviceWorker], push_sock):
+    """Splits a command into one command per targeted channel and queues them on their workers"""
+    channels = cmd["channel"] if isinstance(cmd["channel"], list) else [cmd["channel"]]
+    for channel in channels:
+        if channel in workers:
+            args = cmd.get("args", {})
+            if len(channels) > 1:                                                                                       #channels run concurrently, they must not share output files
+                args = {key: f"{value}/{channel}" if key.endswith("_output_dir") else value for key, value in args.items()}
+            workers[channel].submit(dict(cmd, channel=channel, channels=channels, args=args))
+        else:
+            log.error(f"unknown channel {channel}")
+            push_sock.send_json(json.dumps(dict(cmd, channel=channel, channels=channels,
+                                                result=f"unknown channel {channel}")))
+
+
 def cmd_loop(discos):
-    push_sock, pull_sock, progress_sock = setup_ipc()
+    push_sock, pull_sock, _ = setup_ipc()
+    workers = {channel: DeviceWorker(channel, disco) for channel, disco in discos.items()}
+    for worker in workers.values():
+        worker.start()
     while True:
-        cmd = json.loads(pull_sock.recv_json())
-        push_sock.send_json(parse_cmd(cmd, discos,lambda step, global_progress, step_detail, step_progress: udpate_progress(progress_sock, step, global_progress, step_detail, step_progress)))
+        dispatch(json.loads(pull_sock.recv_json()), workers, push_sock)
 
 
 def turn_all_off(discos:Dict[str,Disco_Driver]):
@@ -245,6 +442,7 @@ def turn_all_off(discos:Dict[str,Disco_Driver]):
 
 
 def main():
+    hold_pidfile("discovery_driver")
     mkdir(cfg.log_dir())
     log.basicConfig(filename=f'{cfg.log_dir()}/disco-server-{datetime.datetime.now()}.log',
                     format='%(asctime)s - %(message)s',
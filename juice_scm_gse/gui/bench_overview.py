@@ -0,0 +1,67 @@
+import time
+from PySide2.QtWidgets import QTableWidget, QTableWidgetItem
+from PySide2.QtCore import QThread, Signal
+from juice_scm_gse.benches import BenchMultiplexer
+
+COLUMNS = [("Status", None), ("Age (s)", None)] + \
+          [(f"I CH{ch} (mA)", f"CONSO_CH{ch}") for ch in ["X", "Y", "Z"]] + \
+          [(f"VDD CH{ch} (V)", f"VDD_CH{ch}") for ch in ["X", "Y", "Z"]] + [("Recorded", None)]
+
+
+class BenchesWorker(QThread):
+    """Runs the BenchMultiplexer poller and emits a snapshot of every bench at most `rate` times per second"""
+    updateBenches = Signal(list)
+
+    def __init__(self, rate=10., record=True):
+        QThread.__init__(self)
+        self.period = 1. / rate
+        self.record = record
+        self.running = True
+
+    def snapshot(self):
+        rows = []
+        for bench in self.multiplexer.benches.values():
+            cells = [bench.status, "-" if bench.age is None else f"{bench.age:.1f}"]
+            for _, key in COLUMNS[2:-1]:
+                value = bench.value(key)
+                cells.append("-" if value is None else f"{value:.3g}")
+            cells.append("-" if bench.recorder is None else str(bench.recorder.rows_written))
+            rows.append((bench.name, cells))
+        return rows
+
+    def run(self):
+        self.multiplexer = BenchMultiplexer()                                                                          #sockets belong to this thread
+        if self.record:
+            self.multiplexer.record_all()
+        last_emit = 0.
+        while self.running:
+            self.multiplexer.poll(int(self.period * 1000))
+            now = time.time()
+            if now - last_emit >= self.period:
+                last_emit = now
+                self.updateBenches.emit(self.snapshot())
+        self.multiplexer.close()
+
+    def stop(self):
+        self.running = False
+        self.wait()
+
+
+class BenchOverview(QTableWidget):
+    """One line per bench, cells are only rewritten when their text changes"""
+
+    def __init__(self, parent=None):
+        super(BenchOverview, self).__init__(0, len(COLUMNS), parent)
+        self.setHorizontalHeaderLabels([title for title, _ in COLUMNS])
+
+    def update_benches(self, rows):
+        if self.rowCount() != len(rows):
+            self.setRowCount(len(rows))
+            self.setVerticalHeaderLabels([name for name, _ in rows])
+        for row, (_, cells) in enumerate(rows):
+            for column, text in enumerate(cells):
+                item = self.item(row, column)
+                if item is None:
+                    self.setItem(row, column, QTableWidgetItem(text))
+                elif item.text() != text:
+                    item.setText(text)
@@ -0,0 +1,36 @@
+from typing import Dict
+from PySide2.QtWidgets import QLCDNumber
+from PySide2.QtCore import QObject, QTimer
+
+
+class LcdRenderer(QObject):
+    """Coalesces voltage updates to a maximum display rate and only repaints the LCDs whose
+    displayed text changes.
+
+    widgets maps a value key (as emitted by VoltagesWorker.updateVoltages) to its QLCDNumber.
+    """
+
+    def __init__(self, widgets: Dict[str, QLCDNumber], rate=10., parent=None):
+        super(LcdRenderer, self).__init__(parent)
+        self.widgets = [(key, widget, widget.digitCount()) for key, widget in widgets.items()]
+        self._latest = None
+        self._displayed = {}
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(int(1000. / rate))
+        self.timer.timeout.connect(self.render)
+
+    def update(self, values):
+        self._latest = values                                                                                           #only the newest values of a burst are shown
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def render(self):
+        if self._latest is None:
+            return
+        values, self._latest = self._latest, None
+        for key, widget, digits in self.widgets:
+            text = f"{values[key]:.{digits}g}"                                                                         #same formatting as QLCDNumber.display(float)
+            if self._displayed.get(key) != text:
+                self._displayed[key] = text
+                widget.display(text)
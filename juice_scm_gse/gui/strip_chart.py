@@ -0,0 +1,96 @@
+from typing import List
+import time
+import numpy as np
+from PySide2.QtWidgets import QWidget
+from PySide2.QtGui import QPainter, QPen, QColor, QPolygonF
+from PySide2.QtCore import QPointF, QTimer, Qt
+
+COLORS = [Qt.red, Qt.darkGreen, Qt.blue, Qt.darkMagenta, Qt.darkCyan, Qt.darkYellow, Qt.black]
+
+
+class History:
+    """Fixed size ring buffer of timestamped samples (capacity x channels)"""
+
+    def __init__(self, channels, capacity=1 << 17):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity)
+        self.values = np.zeros((capacity, channels))
+        self.written = 0
+
+    def append(self, timestamp, values):
+        index = self.written % self.capacity
+        self.timestamps[index] = timestamp
+        self.values[index] = values
+        self.written += 1
+
+    def window(self, start, stop):
+        """Samples with start <= timestamp <= stop, in chronological order"""
+        if self.written <= self.capacity:
+            timestamps, values = self.timestamps[:self.written], self.values[:self.written]
+        else:
+            first = self.written % self.capacity
+            timestamps = np.roll(self.timestamps, -first)
+            values = np.roll(self.values, -first, axis=0)
+        begin = int(np.searchsorted(timestamps, start, side='left'))
+        end = int(np.searchsorted(timestamps, stop, side='right'))
+        return timestamps[begin:end], values[begin:end]
+
+
+def minmax_downsample(timestamps, values, buckets):
+    """Keeps the min and the max of each bucket so peaks survive decimation.
+
+    values is (samples x channels), returns at most 2*buckets samples per channel.
+    """
+    if len(timestamps) <= 2 * buckets:
+        return np.repeat(timestamps[:, None], values.shape[1], axis=1), values
+    size = len(timestamps) // buckets
+    n = size * buckets
+    t = timestamps[:n].reshape(buckets, size)
+    v = values[:n].reshape(buckets, size, -1)
+    rows = np.arange(buckets)[:, None]
+    lo, hi = v.argmin(axis=1), v.argmax(axis=1)                                                                         #(buckets x channels)
+    first, second = np.minimum(lo, hi), np.maximum(lo, hi)                                                              #keep the chronological order inside a bucket
+    channels = np.arange(v.shape[2])[None, :]
+    out_t = np.stack((t[rows, first], t[rows, second]), axis=1).reshape(2 * buckets, -1)
+    out_v = np.stack((v[rows, first, channels], v[rows, second, channels]), axis=1).reshape(2 * buckets, -1)
+    return out_t, out_v
+
+
+class StripChart(QWidget):
+    """Live time series of a few value keys over the last `span` seconds"""
+
+    def __init__(self, keys: List[str], title="", span=3600., refresh_rate=2., parent=None):
+        super(StripChart, self).__init__(parent)
+        self.keys = keys
+        self.title = title
+        self.span = span
+        self.history = History(len(keys))
+        self.setMinimumSize(300, 150)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.update)
+        self.timer.start(int(1000. / refresh_rate))
+
+    def add_values(self, values):
+        self.history.append(time.time(), [values[key] for key in self.keys])
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+        painter.drawText(5, 15, self.title)
+        stop = time.time()
+        timestamps, values = self.history.window(stop - self.span, stop)
+        if len(timestamps) < 2:
+            return
+        width, height = self.width(), self.height() - 20
+        t, v = minmax_downsample(timestamps, values, max(width // 2, 1))
+        low, high = np.min(v), np.max(v)
+        scale = (high - low) or 1.
+        xs = (t - (stop - self.span)) / self.span * width
+        ys = 20 + height - (v - low) / scale * height
+        for channel, key in enumerate(self.keys):
+            painter.setPen(QPen(QColor(COLORS[channel % len(COLORS)]), 1))
+            painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in zip(xs[:, channel], ys[:, channel])]))
+            painter.drawText(5 + 90 * (channel + 1), 15, key)
+        painter.setPen(QPen(Qt.black))
+        painter.drawText(5, 30, f"{high:.4g}")
+        painter.drawText(5, self.height() - 5, f"{low:.4g}")
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Qt free recording service, does what the GUI does for unattended benches.
+
+Subscribes to the monitor Voltages, calibrates them, tags them with the ASIC serial number and the
+burn-in step and records them. It is driven from the command line at startup and afterwards over
+a REP socket, `Juice_SCM_Recorder --command "asic 012"` sends one command to a running service.
+
+Commands: asic <SN>, step <PreBurnIn|PostBurnIn>, start, stop, alims <on|off>, ack, status, quit
+
+ack acknowledges the monitor alarms, latched ones are cleared once their channel is back in range.
+"""
+
+import sys, json, argparse
+from datetime import datetime
+import zmq
+import juice_scm_gse.config as cfg
+from juice_scm_gse.arduino_monitor.protocol import unpack_frames
+from juice_scm_gse.calibration import load_calibration
+from juice_scm_gse.utils import mkdir
+from juice_scm_gse.utils.recorder import BackgroundRecorder
+
+
+class HeadlessRecorder:
+    def __init__(self, port=9990, portPair=9991, control_port=9995):
+        self.context = zmq.Context()
+        self.sock = self.context.socket(zmq.SUB)
+        self.sock.connect(f"tcp://localhost:{port}")
+        self.sock.setsockopt(zmq.SUBSCRIBE, b"Voltages")
+        self.sockPair = self.context.socket(zmq.PAIR)
+        self.sockPair.connect(f"tcp://localhost:{portPair}")
+        self.control = self.context.socket(zmq.REP)
+        self.control.bind(f"tcp://*:{control_port}")
+        self.calibration = load_calibration()
+        self.path = cfg.global_workdir.get() + "/ASICs"
+        mkdir(self.path)
+        self.asic = None
+        self.burnin_step = "None"
+        self.recorder = None
+        self.received = 0
+        self.running = True
+
+    def set_asic(self, asic):
+        self.asic = asic
+        self.sockPair.send(f"ASIC_JUICEMagic3_SN_{asic}_{self.burnin_step}".encode())                                  #marks the monitor recording
+        if self.recorder is not None:
+            self.start_recording()
+
+    def set_step(self, step):
+        self.burnin_step = step
+        if self.asic is not None:
+            self.set_asic(self.asic)
+
+    def start_recording(self):
+        if self.asic is None:
+            raise ValueError("no ASIC serial number set")
+        self.stop_recording()
+        fname = f"{self.path}/ASIC_JUICEMagic3_SN_{self.asic}_{self.burnin_step}-{str(datetime.now())}"
+        metadata = {"asic": self.asic, "burnin_step": self.burnin_step, **self.calibration.metadata()}
+        self.recorder = BackgroundRecorder(fname, self.calibration.names, metadata=metadata)
+        self.recorder.start()
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder.join()
+            self.recorder = None
+
+    def alims(self, state):
+        self.sockPair.send(("Enable alims" if state == "on" else "Disable alims").encode())
+
+    def acknowledge_alarms(self):
+        self.sockPair.send(b"Acknowledge alarms")
+
+    def status(self):
+        status = {"asic": self.asic, "burnin_step": self.burnin_step, "received": self.received,
+                  "calibration": self.calibration.version, "recording": self.recorder is not None}
+        if self.recorder is not None:
+            status.update({"path": self.recorder.path, "rows": self.recorder.rows_written,
+                           "queue_depth": self.recorder.queue_depth, "write_latency": self.recorder.write_latency})
+        return status
+
+    def handle_command(self, command: str):
+        name, _, argument = command.strip().partition(' ')
+        try:
+            if name == "asic":
+                self.set_asic(argument)
+            elif name == "step":
+                self.set_step(argument)
+            elif name == "start":
+                self.start_recording()
+            elif name == "stop":
+                self.stop_recording()
+            elif name == "alims":
+                self.alims(argument)
+            elif name == "ack":
+                self.acknowledge_alarms()
+            elif name == "quit":
+                self.running = False
+            elif name != "status":
+                raise ValueError(f"unknown command {name}")
+        except ValueError as e:
+            return {"error": str(e)}
+        return self.status()
+
+    def handle_voltages(self):
+        _, timestamp, frames = unpack_frames(self.sock.recv_multipart(copy=False))
+        self.received += 1
+        if self.recorder is not None:
+            self.recorder.append(timestamp, self.calibration.convert(frames[0]))
+
+    def run(self):
+        poller = zmq.Poller()
+        poller.register(self.sock, zmq.POLLIN)
+        poller.register(self.control, zmq.POLLIN)
+        while self.running:
+            for sock, _ in poller.poll():
+                if sock is self.sock:
+                    self.handle_voltages()
+                else:
+                    self.control.send_json(self.handle_command(self.control.recv().decode()))
+        self.stop_recording()
+
+
+def send_command(command, control_port=9995, timeout=2.):
+    sock = zmq.Context.instance().socket(zmq.REQ)
+    sock.setsockopt(zmq.LINGER, 0)
+    sock.connect(f"tcp://localhost:{control_port}")
+    sock.send(command.encode())
+    if not sock.poll(int(timeout * 1000)):
+        return {"error": "no answer from the recorder"}
+    return sock.recv_json()
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--asic", help="ASIC serial number")
+    parser.add_argument("--step", choices=["PreBurnIn", "PostBurnIn"], help="burn-in step")
+    parser.add_argument("--record", action='store_true', help="start recording right away")
+    parser.add_argument("--supervise", action='store_true', help="also start and watch the Arduino monitor")
+    parser.add_argument("--control-port", type=int, default=9995)
+    parser.add_argument("--command", help="send a command to a running recorder and exit")
+    args = parser.parse_args(args)
+    if args.command:
+        print(json.dumps(send_command(args.command, args.control_port)))
+        return
+    recorder = HeadlessRecorder(control_port=args.control_port)
+    supervisor = None
+    if args.supervise:
+        from juice_scm_gse.utils.supervisor import Supervisor
+        supervisor = Supervisor()
+        supervisor.add("arduino_monitor", ['Juice_Ardiuno_Monitor'], heartbeat_endpoint="tcp://localhost:9990",
+                       heartbeat_topic=b"Stats")
+        supervisor.start()
+    if args.step:
+        recorder.burnin_step = args.step
+    if args.asic:
+        recorder.set_asic(args.asic)
+    if args.record:
+        recorder.start_recording()
+    print(json.dumps(recorder.status()))
+    try:
+        recorder.run()
+    finally:
+        recorder.stop_recording()
+        if supervisor is not None:
+            supervisor.stop()
+
+
+if __name__ == '__main__':
+    main()
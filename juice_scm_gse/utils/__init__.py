@@ -1,9 +1,14 @@
 import os
 from typing import List
-import pint
 
-ureg = pint.UnitRegistry()
-Q_ = ureg.Quantity
+
+def __getattr__(name):                                                                                                  #building the unit registry costs more than the rest of the GUI imports
+    if name in ("ureg", "Q_"):
+        import pint
+        globals()["ureg"] = pint.UnitRegistry()
+        globals()["Q_"] = globals()["ureg"].Quantity
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def mkdir(directory):
     if not os.path.exists(directory):
@@ -0,0 +1,216 @@
+import os, json, time
+from collections import namedtuple
+from queue import Queue, Empty
+from threading import Thread
+from datetime import datetime
+import numpy as np
+from juice_scm_gse.utils import mkdir
+
+RECORDING_FORMAT_VERSION = 1
+
+Recording = namedtuple("Recording", ["metadata", "timestamps", "frames", "events"])
+
+
+class ChunkedRecorder:
+    """Records frames as a directory of .npy chunks.
+
+    Layout:
+        meta.json       columns names, format version and user metadata
+        index.jsonl     one line per chunk: file, rows, first and last timestamp
+        chunk_*.npy     float64 array (rows x (1 + columns)), first column is the POSIX timestamp
+        events.jsonl    side table of events (ASIC markers, headers...) with the frame position they occurred at
+
+    Rows are kept in a preallocated buffer and written as one chunk once chunk_size rows are
+    available or when flush() is called.
+    """
+
+    def __init__(self, path, columns, chunk_size=4096, metadata=None):
+        self.path = path
+        self.columns = list(columns)
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self.chunks = 0
+        self._buffer = np.empty((chunk_size, 1 + len(self.columns)))
+        self._buffered = 0
+        mkdir(path)
+        with open(f"{path}/meta.json", 'w') as meta:
+            json.dump({"format_version": RECORDING_FORMAT_VERSION, "columns": self.columns,
+                       "created": str(datetime.now()), **(metadata or {})}, meta)
+        self._index = open(f"{path}/index.jsonl", 'a')
+        self._events = open(f"{path}/events.jsonl", 'a')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def append(self, timestamps, frames):
+        timestamps = np.broadcast_to(timestamps, (len(frames),))
+        done = 0
+        while done < len(frames):
+            n = min(len(frames) - done, self.chunk_size - self._buffered)
+            self._buffer[self._buffered:self._buffered + n, 0] = timestamps[done:done + n]
+            self._buffer[self._buffered:self._buffered + n, 1:] = frames[done:done + n]
+            self._buffered += n
+            done += n
+            if self._buffered == self.chunk_size:
+                self._write_chunk()
+
+    def mark(self, timestamp, text):
+        self._events.write(json.dumps({"position": self.rows + self._buffered, "timestamp": timestamp,
+                                       "text": text}) + '\n')
+
+    def _write_chunk(self):
+        if not self._buffered:
+            return
+        chunk = self._buffer[:self._buffered]
+        fname = f"chunk_{self.chunks:06d}.npy"
+        np.save(f"{self.path}/{fname}", chunk)
+        self._index.write(json.dumps({"file": fname, "rows": len(chunk), "first": chunk[0, 0],
+                                      "last": chunk[-1, 0]}) + '\n')
+        self.rows += self._buffered
+        self.chunks += 1
+        self._buffered = 0
+
+    def flush(self):
+        self._write_chunk()
+        self._index.flush()
+        self._events.flush()
+
+    def close(self):
+        self.flush()
+        self._index.close()
+        self._events.close()
+
+
+class BackgroundRecorder(Thread):
+    """ChunkedRecorder running on its own thread, append() and mark() only enqueue.
+
+    Queued rows are written in batches, the recording is flushed every flush_period seconds or
+    flush_rows rows. queue_depth and write_latency (seconds spent in the last batch write) tell
+    whether the disk keeps up.
+    """
+
+    def __init__(self, path, columns, chunk_size=4096, metadata=None, flush_period=30., flush_rows=4096):
+        Thread.__init__(self, daemon=True)
+        self.path = path
+        self.columns = list(columns)
+        self.chunk_size = chunk_size
+        self.metadata = metadata
+        self.flush_period = flush_period
+        self.flush_rows = flush_rows
+        self.write_latency = 0.
+        self.max_write_latency = 0.
+        self.rows_written = 0
+        self._queue = Queue()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def append(self, timestamp, values):
+        self._queue.put((timestamp, values))
+
+    def mark(self, timestamp, text):
+        self._queue.put((timestamp, str(text)))
+
+    def close(self):
+        self._queue.put(None)
+
+    def _get_batch(self):
+        try:
+            items = [self._queue.get(timeout=self.flush_period)]
+        except Empty:
+            return []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except Empty:
+                return items
+
+    @staticmethod
+    def _append_rows(recorder, rows):
+        if rows:
+            recorder.append(np.array([stamp for stamp, _ in rows]), np.array([values for _, values in rows]))
+        return len(rows)
+
+    def run(self):
+        recorder = ChunkedRecorder(self.path, self.columns, self.chunk_size, self.metadata)
+        unflushed_rows = 0
+        last_flush = time.time()
+        closed = False
+        while not closed:
+            items = self._get_batch()
+            start = time.time()
+            rows, written = [], 0
+            for item in items:
+                if item is None:
+                    closed = True
+                    break
+                if isinstance(item[1], str):                                                                            #keep markers at their position between rows
+                    written += self._append_rows(recorder, rows)
+                    rows = []
+                    recorder.mark(*item)
+                else:
+                    rows.append(item)
+            written += self._append_rows(recorder, rows)
+            unflushed_rows += written
+            self.rows_written += written
+            if unflushed_rows >= self.flush_rows or (start - last_flush) >= self.flush_period:
+                recorder.flush()
+                unflushed_rows = 0
+                last_flush = start
+            if items:
+                self.write_latency = time.time() - start
+                self.max_write_latency = max(self.max_write_latency, self.write_latency)
+        recorder.close()
+
+
+class SnapshotWriter(Thread):
+    """Saves arrays to .npy files on its own thread so the acquisition does not wait for the disk.
+
+    put() only enqueues, close() waits until everything queued is written and raises the first
+    write error if any.
+    """
+
+    def __init__(self, max_queued=8):
+        Thread.__init__(self, daemon=True)
+        self.written = 0
+        self.error = None
+        self._queue = Queue(maxsize=max_queued)                                                                         #bounds memory if the disk is slower than the acquisition
+
+    def put(self, fname, array):
+        self._queue.put((fname, array))
+
+    def close(self):
+        self._queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                np.save(*item)
+                self.written += 1
+            except Exception as e:
+                self.error = self.error or e
+
+
+def _read_jsonl(fname):
+    if not os.path.exists(fname):
+        return []
+    with open(fname) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_recording(path) -> Recording:
+    with open(f"{path}/meta.json") as meta:
+        metadata = json.load(meta)
+    chunks = [np.load(f"{path}/{entry['file']}") for entry in _read_jsonl(f"{path}/index.jsonl")]
+    data = np.concatenate(chunks) if chunks else np.empty((0, 1 + len(metadata["columns"])))
+    return Recording(metadata, data[:, 0], data[:, 1:], _read_jsonl(f"{path}/events.jsonl"))
@@ -0,0 +1,188 @@
+import os, time, fcntl, signal, subprocess
+from threading import Thread, Event
+import zmq
+import juice_scm_gse.config as cfg
+from juice_scm_gse.utils import mkdir
+
+_held_pidfiles = {}
+
+
+def pidfile_path(name):
+    return f"{cfg.run_dir()}/{name}.pid"
+
+
+def hold_pidfile(name):
+    """Called by a supervised process at startup, the lock is held until the process dies"""
+    mkdir(cfg.run_dir())
+    f = open(pidfile_path(name), 'a+')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        raise RuntimeError(f"{name} is already running")
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    _held_pidfiles[name] = f
+
+
+def running_pid(name):
+    """Pid of the live process holding the pidfile lock, None if nobody holds it"""
+    if not os.path.exists(pidfile_path(name)):
+        return None
+    with open(pidfile_path(name), 'a+') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return None
+        except OSError:
+            f.seek(0)
+            content = f.read().strip()
+            return int(content) if content else None
+
+
+def _wait_released(name, timeout):
+    deadline = time.time() + timeout
+    while running_pid(name) is not None and time.time() < deadline:
+        time.sleep(.05)
+    return running_pid(name) is None
+
+
+def kill_stale(name, timeout=5., term_timeout=3.):
+    """SIGTERM first so the process can close its recordings, SIGKILL if it still holds its pidfile after term_timeout"""
+    for sig, wait in ((signal.SIGTERM, term_timeout), (signal.SIGKILL, timeout)):
+        pid = running_pid(name)
+        if pid is None:
+            return
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            return
+        if _wait_released(name, wait):
+            return
+
+
+class Supervised:
+    def __init__(self, name, command, heartbeat_endpoint=None, heartbeat_topic=b"", heartbeat_timeout=5.,
+                 grace_period=10., term_timeout=3., min_backoff=1., max_backoff=60., stable_time=30.):
+        self.name = name
+        self.command = command
+        self.heartbeat_endpoint = heartbeat_endpoint
+        self.heartbeat_topic = heartbeat_topic
+        self.heartbeat_timeout = heartbeat_timeout
+        self.grace_period = grace_period                                                                                #time allowed to start before the first heartbeat
+        self.term_timeout = term_timeout                                                                                #time allowed to exit on SIGTERM before SIGKILL
+        self.min_backoff = min_backoff                                                                                  #restart delays double from min_backoff up to max_backoff
+        self.max_backoff = max_backoff
+        self.stable_time = stable_time                                                                                  #a child that ran that long starts again from min_backoff
+        self.failures = 0
+        self.restart_at = None
+        self.process = None
+        self.restarts = 0
+        self.started_at = None
+        self.last_heartbeat = None
+
+    @property
+    def uptime(self):
+        if self.started_at is None:
+            return 0.
+        return time.time() - self.started_at
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, stopping: Event = None):
+        kill_stale(self.name, term_timeout=self.term_timeout)
+        if stopping is not None and stopping.is_set():                                                                  #stopped while killing a stale instance
+            return
+        self.process = subprocess.Popen(self.command)
+        self.started_at = time.time()
+        self.last_heartbeat = None
+        self.restart_at = None
+
+    def schedule_restart(self, now):
+        if self.uptime >= self.stable_time:
+            self.failures = 0
+        self.failures += 1
+        self.restart_at = now + min(self.min_backoff * 2 ** (self.failures - 1), self.max_backoff)
+
+    def stop(self):
+        if self.alive():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=self.term_timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+    def heartbeat_lost(self, now):
+        if self.heartbeat_endpoint is None:
+            return False
+        last = self.last_heartbeat or (self.started_at + self.grace_period - self.heartbeat_timeout)
+        return (now - last) > self.heartbeat_timeout
+
+    def status(self):
+        return {"alive": self.alive(), "restarts": self.restarts, "uptime": self.uptime,
+                "restart_in": None if self.restart_at is None else max(self.restart_at - time.time(), 0.)}
+
+
+class Supervisor(Thread):
+    """Starts processes, restarts them when they exit or stop sending heartbeats.
+
+    Restarts are delayed with an exponential backoff so a child that cannot start (port already
+    bound...) does not respawn in a loop.
+
+    Stale instances are found through their pidfile lock (see hold_pidfile) instead of scanning
+    every process of the host.
+    """
+
+    def __init__(self, check_period=.5):
+        Thread.__init__(self, daemon=True)
+        self.check_period = check_period
+        self.children = {}
+        self._stopping = Event()
+
+    def add(self, name, command, **kwargs) -> Supervised:
+        self.children[name] = Supervised(name, command, **kwargs)
+        return self.children[name]
+
+    def status(self):
+        return {name: child.status() for name, child in self.children.items()}
+
+    def stop(self):
+        self._stopping.set()
+        if self.is_alive():
+            self.join()                                                                                                 #a restart in progress must not Popen after the children were stopped
+        for child in self.children.values():
+            child.stop()
+
+    def run(self):
+        context = zmq.Context.instance()
+        poller = zmq.Poller()
+        sockets = {}
+        for child in self.children.values():
+            if child.heartbeat_endpoint is not None:
+                sock = context.socket(zmq.SUB)
+                sock.connect(child.heartbeat_endpoint)
+                sock.setsockopt(zmq.SUBSCRIBE, child.heartbeat_topic)
+                poller.register(sock, zmq.POLLIN)
+                sockets[sock] = child
+            child.start(self._stopping)
+        while not self._stopping.is_set():
+            for sock, _ in poller.poll(int(self.check_period * 1000)):
+                while sock.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                    sock.recv_multipart()
+                sockets[sock].last_heartbeat = time.time()
+            now = time.time()
+            for child in self.children.values():
+                if self._stopping.is_set():
+                    break
+                if child.restart_at is not None:
+                    if now >= child.restart_at:
+                        child.restarts += 1
+                        child.start(self._stopping)
+                elif not child.alive() or child.heartbeat_lost(now):
+                    child.stop()
+                    child.schedule_restart(now)
+        for sock in sockets:
+            sock.close(linger=0)
@@ -12,7 +12,7 @@ setup(
     author="Alexis Jeandet",
     author_email='alexis.jeandet@member.fsf.org',
     url='https://github.com/jeandet/Juice_SCM_GSE',
-    packages=['juice_scm_gse', 'juice_scm_gse.gui', 'juice_scm_gse.utils', 'juice_scm_gse.config', 'juice_scm_gse.analysis', 'juice_scm_gse.arduino_monitor', 'juice_scm_gse.discovery_driver'],
+    packages=['juice_scm_gse', 'juice_scm_gse.gui', 'juice_scm_gse.utils', 'juice_scm_gse.config', 'juice_scm_gse.calibration', 'juice_scm_gse.analysis', 'juice_scm_gse.arduino_monitor', 'juice_scm_gse.discovery_driver'],
 #    package_data={'juice_scm_gse.images': ['*.png']},
     data_files=[
         ('share/icons/hicolor/scalable/apps', ['juice-scm-egse.svg'])
@@ -21,7 +21,10 @@ setup(
         'console_scripts': [
             'Juice_SCM_GSE=juice_scm_gse.app:main',
             'Juice_Ardiuno_Monitor=juice_scm_gse.arduino_monitor:main',
-            'Juice_Discovery_Driver=juice_scm_gse.discovery_driver:main'
+            'Juice_Discovery_Driver=juice_scm_gse.discovery_driver:main',
+            'Juice_Ardiuno_Monitor_Async=juice_scm_gse.arduino_monitor.aio:main',
+            'Juice_Monitor_Replay=juice_scm_gse.arduino_monitor.replay:main',
+            'Juice_SCM_Recorder=juice_scm_gse.headless:main'
         ]
     },
     install_requires=requirements,